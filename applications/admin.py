@@ -1,5 +1,17 @@
 from django.contrib import admin
-from .models import College, Program, Recommender, Document, Application, Notification
+from .models import (
+    College,
+    Program,
+    Recommender,
+    Document,
+    Application,
+    Notification,
+    StateOutbox,
+    S3Tombstone,
+    ProgramExpectation,
+    StoredObject,
+    MailboxCheckpoint,
+)
 
 admin.site.register(College)
 admin.site.register(Program)
@@ -7,3 +19,8 @@ admin.site.register(Recommender)
 admin.site.register(Document)
 admin.site.register(Application)
 admin.site.register(Notification)
+admin.site.register(StateOutbox)
+admin.site.register(S3Tombstone)
+admin.site.register(ProgramExpectation)
+admin.site.register(StoredObject)
+admin.site.register(MailboxCheckpoint)
@@ -0,0 +1,120 @@
+# applications/analysis_cache.py
+"""
+Cache of finished SOP analyses.
+
+A completed Groq stream is stored under a hash of its inputs, so re-opening
+the same analysis replays the stored markdown through the same streaming
+response instead of paying for (and waiting on) another generation. Only
+streams that run to completion with every part reviewed are stored.
+Entries expire after TTL and the table is capped at MAX_BYTES, evicting
+least-recently-used entries first.
+"""
+
+import datetime
+import hashlib
+import os
+from typing import AsyncIterable, AsyncIterator, Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import SopAnalysis
+
+TTL = datetime.timedelta(
+    seconds=int(os.getenv("APPMGR_ANALYSIS_CACHE_TTL", str(30 * 24 * 3600)))
+)
+MAX_BYTES = int(os.getenv("APPMGR_ANALYSIS_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Bump when the prompt changes so old analyses are not replayed for it.
+PROMPT_VERSION = "3"
+REPLAY_CHUNK = 512
+TOUCH_INTERVAL = datetime.timedelta(minutes=10)
+
+
+def analysis_key(
+    sop_text: str,
+    college: str,
+    program: str,
+    notes: str,
+    model: str,
+    research: str = "",
+) -> str:
+    h = hashlib.sha256()
+    for part in (PROMPT_VERSION, model, college, program, notes, research, sop_text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def lookup(cache_key: str) -> Optional[str]:
+    """Stored markdown for cache_key, or None on a miss or expired entry."""
+    hit = SopAnalysis.objects.filter(cache_key=cache_key).first()
+    if hit is None:
+        return None
+    now = timezone.now()
+    if now - hit.created_at > TTL:
+        SopAnalysis.objects.filter(pk=hit.pk).delete()
+        return None
+    if now - hit.last_used_at > TOUCH_INTERVAL:
+        SopAnalysis.objects.filter(pk=hit.pk).update(last_used_at=now)
+    return hit.markdown
+
+
+async def replay(markdown: str) -> AsyncIterator[bytes]:
+    data = markdown.encode("utf-8")
+    for i in range(0, len(data), REPLAY_CHUNK):
+        yield data[i : i + REPLAY_CHUNK]
+
+
+def _evict() -> None:
+    SopAnalysis.objects.filter(created_at__lt=timezone.now() - TTL).delete()
+    total = SopAnalysis.objects.aggregate(total=Sum("size"))["total"] or 0
+    if total <= MAX_BYTES:
+        return
+    doomed = []
+    for pk, size in SopAnalysis.objects.order_by("last_used_at").values_list(
+        "pk", "size"
+    ):
+        doomed.append(pk)
+        total -= size
+        if total <= MAX_BYTES:
+            break
+    SopAnalysis.objects.filter(pk__in=doomed).delete()
+
+
+def store(cache_key: str, model: str, markdown: str) -> None:
+    data = markdown.encode("utf-8")
+    if not data.strip() or len(data) > MAX_BYTES:
+        return
+    SopAnalysis.objects.filter(cache_key=cache_key).delete()
+    try:
+        SopAnalysis.objects.create(
+            cache_key=cache_key, model=model, markdown=markdown, size=len(data)
+        )
+    except IntegrityError:
+        return  # a concurrent stream stored it first
+    _evict()
+
+
+async def record(
+    cache_key: str,
+    model: str,
+    chunks: AsyncIterable[bytes],
+    complete: Callable[[], bool] = lambda: True,
+) -> AsyncIterator[bytes]:
+    """
+    Pass chunks through unchanged and store the full markdown once the
+    stream ends normally and complete() agrees. A client disconnect or
+    upstream error closes the generator early and nothing is stored; so
+    does a degraded analysis, which would otherwise be replayed until
+    someone asks for fresh=1.
+    """
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    if not complete():
+        return
+    markdown = b"".join(parts).decode("utf-8", errors="replace")
+    await sync_to_async(store)(cache_key, model, markdown)
@@ -2,9 +2,60 @@ import os, datetime, json, urllib.parse
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth.decorators import login_required
-import boto3
+from django.db import transaction
 
-from .models import Application, Attachment
+from . import aws, dedup, indexing, multipart, s3_gc
+from .models import Application, Attachment, StoredObject
+
+DOC_TYPES = ("SOP", "LOR", "RESUME", "OTHER")
+MAX_BATCH = 50
+
+
+def _upload_key(user, app, doc_type, filename, sha256):
+    safe_name = os.path.basename(filename)
+    if sha256:
+        return dedup.content_key(user, sha256, safe_name)
+    user_part = user.username.replace("/", "-")
+    college_part = app.college_name.replace("/", "-")
+    program_part = app.program_name.replace("/", "-")
+    prefix = f"{user_part}/{college_part}/{program_part}/{doc_type}"
+    return f"{prefix}/{int(datetime.datetime.utcnow().timestamp())}_{safe_name}"
+
+
+def _presigned_post(key, content_type):
+    fields = {"acl": "private", "Content-Type": content_type}
+    conditions = [
+        {"acl": "private"},
+        ["starts-with", "$Content-Type", ""],
+        ["content-length-range", 0, 25 * 1024 * 1024],
+    ]
+    return aws.client("s3").generate_presigned_post(
+        Bucket=os.getenv("AWS_STORAGE_BUCKET_NAME"),
+        Key=key,
+        Fields=fields,
+        Conditions=conditions,
+        ExpiresIn=300,
+    )
+
+
+def _attachment_json(att):
+    return {"id": att.id, "title": att.title}
+
+
+def _attach(user, app, doc_type, title, key, sha256):
+    """Create the Attachment for an uploaded key. Raises dedup.DedupError."""
+    if not dedup.owns_key(user, key):
+        # Deleting the attachment would tombstone key: only the user's own.
+        raise dedup.DedupError("key is not one of your uploads")
+    att = Attachment(application=app, doc_type=doc_type, title=title)
+    with transaction.atomic():
+        if sha256:
+            att.stored_object = dedup.acquire(user, sha256, key)
+            key = att.stored_object.key
+        att.file.name = key
+        att.save()
+    indexing.schedule(att)
+    return att
 
 
 @login_required
@@ -17,38 +68,23 @@ def create_presigned_post(request):
         return HttpResponseBadRequest("bad application_id")
     filename = request.GET.get("filename")
     doc_type = request.GET.get("doc_type")  # SOP or LOR
-    if not (app_id and filename and doc_type in ("SOP", "LOR", "RESUME", "OTHER")):
+    if not (app_id and filename and doc_type in DOC_TYPES):
         return HttpResponseBadRequest("missing params or bad doc_type")
 
     app = Application.objects.get(pk=app_id, user=request.user)
 
-    user_part = request.user.username.replace("/", "-")
-    college_part = app.college_name.replace("/", "-")
-    program_part = app.program_name.replace("/", "-")
-    safe_name = os.path.basename(filename)
-    prefix = f"{user_part}/{college_part}/{program_part}/{doc_type}"
-    key = f"{prefix}/{int(datetime.datetime.utcnow().timestamp())}_{safe_name}"
+    # With a content hash, identical bytes are stored (and sent) only once.
+    sha256 = dedup.normalize(request.GET.get("sha256"))
+    if sha256:
+        existing = dedup.find(request.user, sha256)
+        if existing:
+            return JsonResponse({"exists": True, "key": existing.key})
 
-    s3 = boto3.client(
-        "s3",
-        region_name=os.getenv("AWS_S3_REGION_NAME", "ap-southeast-1"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    )
-    bucket = os.getenv("AWS_STORAGE_BUCKET_NAME")
-    fields = {
-        "acl": "private",
-        "Content-Type": request.GET.get("content_type", "application/octet-stream"),
-    }
-    conditions = [
-        {"acl": "private"},
-        ["starts-with", "$Content-Type", ""],
-        ["content-length-range", 0, 25 * 1024 * 1024],
-    ]
-    resp = s3.generate_presigned_post(
-        Bucket=bucket, Key=key, Fields=fields, Conditions=conditions, ExpiresIn=300
-    )
-    return JsonResponse({"post": resp, "key": key})
+    key = _upload_key(request.user, app, doc_type, filename, sha256)
+
+    content_type = request.GET.get("content_type", "application/octet-stream")
+    resp = _presigned_post(key, content_type)
+    return JsonResponse({"exists": False, "post": resp, "key": key})
 
 
 @login_required
@@ -62,11 +98,228 @@ def finalize_upload(request):
         doc_type = data["doc_type"]
         title = (data.get("title") or "").strip() or "Untitled"
         key = data["key"]
+        sha256 = dedup.normalize(data.get("sha256"))
     except Exception:
         return HttpResponseBadRequest("bad payload")
 
     app = Application.objects.get(pk=app_id, user=request.user)
-    att = Attachment(application=app, doc_type=doc_type, title=title)
-    att.file.name = key
-    att.save()
-    return JsonResponse({"id": att.id, "title": att.title})
+    try:
+        att = _attach(request.user, app, doc_type, title, key, sha256)
+    except dedup.DedupError as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse(_attachment_json(att))
+
+
+# --- batches: one round trip for N files ---------------------------------------
+
+
+@login_required
+@require_POST
+def presign_batch(request):
+    """
+    Body: {"application_id", "doc_type", "files": [{"filename",
+    "content_type", "sha256"}]}. Answers {"uploads": [...]} in the same
+    order, each shaped like a create_presigned_post response.
+    """
+    try:
+        data = json.loads(request.body.decode())
+        app_id = int(str(data["application_id"]).strip())
+        doc_type = data["doc_type"]
+        files = list(data["files"])
+        names = [os.path.basename(f["filename"]) for f in files]
+    except Exception:
+        return HttpResponseBadRequest("bad payload")
+    if doc_type not in DOC_TYPES or not all(names):
+        return HttpResponseBadRequest("missing params or bad doc_type")
+    if not 0 < len(files) <= MAX_BATCH:
+        return HttpResponseBadRequest(f"send between 1 and {MAX_BATCH} files")
+
+    app = Application.objects.get(pk=app_id, user=request.user)
+    hashes = [dedup.normalize(f.get("sha256")) for f in files]
+    existing = dict(
+        StoredObject.objects.filter(
+            user=request.user, sha256__in=[h for h in hashes if h]
+        ).values_list("sha256", "key")
+    )
+
+    uploads = []
+    for f, name, sha256 in zip(files, names, hashes):
+        if sha256 in existing:
+            uploads.append({"exists": True, "key": existing[sha256]})
+            continue
+        key = _upload_key(request.user, app, doc_type, name, sha256)
+        if sha256:
+            # Repeats within the batch are finalized after this one uploads.
+            existing[sha256] = key
+        content_type = f.get("content_type") or "application/octet-stream"
+        uploads.append(
+            {"exists": False, "post": _presigned_post(key, content_type), "key": key}
+        )
+    return JsonResponse({"uploads": uploads})
+
+
+@login_required
+@require_POST
+def finalize_batch(request):
+    """
+    Body: {"application_id", "doc_type", "files": [{"key", "title",
+    "sha256"}]}. Creates every Attachment in one INSERT and answers
+    {"attachments": [{"id", "title"}]} in the same order. All or nothing.
+    """
+    try:
+        data = json.loads(request.body.decode())
+        app_id = int(str(data["application_id"]).strip())
+        doc_type = data["doc_type"]
+        files = [
+            {
+                "key": f["key"],
+                "title": (f.get("title") or "").strip() or "Untitled",
+                "sha256": dedup.normalize(f.get("sha256")),
+            }
+            for f in data["files"]
+        ]
+    except Exception:
+        return HttpResponseBadRequest("bad payload")
+    if doc_type not in DOC_TYPES:
+        return HttpResponseBadRequest("bad doc_type")
+    if not 0 < len(files) <= MAX_BATCH:
+        return HttpResponseBadRequest(f"send between 1 and {MAX_BATCH} files")
+    if not all(dedup.owns_key(request.user, f["key"]) for f in files):
+        return HttpResponseBadRequest("key is not one of your uploads")
+
+    app = Application.objects.get(pk=app_id, user=request.user)
+    refs = {}
+    for f in files:
+        if f["sha256"]:
+            refs.setdefault(f["sha256"], [f["key"], 0])[1] += 1
+
+    try:
+        with transaction.atomic():
+            stored = {
+                sha256: dedup.acquire(request.user, sha256, key, n)
+                for sha256, (key, n) in refs.items()
+            }
+            atts = []
+            for f in files:
+                att = Attachment(application=app, doc_type=doc_type, title=f["title"])
+                att.stored_object = stored.get(f["sha256"])
+                att.file.name = att.stored_object.key if att.stored_object else f["key"]
+                atts.append(att)
+            # No Attachment post_save handlers exist, so bulk_create skips
+            # nothing; text indexing is scheduled explicitly below.
+            atts = Attachment.objects.bulk_create(atts)
+    except dedup.DedupError as e:
+        return HttpResponseBadRequest(str(e))
+    for att in atts:
+        indexing.schedule(att)
+    return JsonResponse({"attachments": [_attachment_json(a) for a in atts]})
+
+
+# --- multipart uploads (see multipart.py) -------------------------------------
+
+
+@login_required
+@require_POST
+def multipart_create(request):
+    try:
+        data = json.loads(request.body.decode())
+        app_id = int(str(data["application_id"]).strip())
+        doc_type = data["doc_type"]
+        filename = data["filename"]
+        size = int(data["size"])
+        content_type = data.get("content_type") or "application/octet-stream"
+        sha256 = dedup.normalize(data.get("sha256"))
+    except Exception:
+        return HttpResponseBadRequest("bad payload")
+    if not (filename and doc_type in DOC_TYPES):
+        return HttpResponseBadRequest("missing params or bad doc_type")
+
+    app = Application.objects.get(pk=app_id, user=request.user)
+    if sha256:
+        existing = dedup.find(request.user, sha256)
+        if existing:
+            return JsonResponse({"exists": True, "key": existing.key})
+
+    key = _upload_key(request.user, app, doc_type, filename, sha256)
+    try:
+        row, part_size, parts = multipart.create(
+            request.user, app, doc_type, key, size, content_type
+        )
+    except multipart.UploadError as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse(
+        {
+            "exists": False,
+            "key": key,
+            "upload_id": row.upload_id,
+            "part_size": part_size,
+            "parts": parts,
+        }
+    )
+
+
+@login_required
+@require_POST
+def multipart_sign_parts(request):
+    try:
+        data = json.loads(request.body.decode())
+        row = multipart.get(request.user, data["upload_id"])
+        urls = multipart.sign_parts(row, data["part_numbers"])
+    except multipart.UploadError as e:
+        return HttpResponseBadRequest(str(e))
+    except Exception:
+        return HttpResponseBadRequest("bad payload")
+    return JsonResponse({"urls": urls})
+
+
+@login_required
+@require_GET
+def multipart_parts(request):
+    try:
+        row = multipart.get(request.user, request.GET.get("upload_id", ""))
+        parts = multipart.list_parts(row)
+    except multipart.UploadError as e:
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse({"parts": parts})
+
+
+@login_required
+@require_POST
+def multipart_complete(request):
+    try:
+        data = json.loads(request.body.decode())
+        row = multipart.get(request.user, data["upload_id"])
+        parts = multipart.parse_parts(data["parts"])
+        title = (data.get("title") or "").strip() or "Untitled"
+        sha256 = dedup.normalize(data.get("sha256"))
+    except multipart.UploadError as e:
+        return HttpResponseBadRequest(str(e))
+    except Exception:
+        return HttpResponseBadRequest("bad payload")
+
+    app, doc_type, key = row.application, row.doc_type, row.key
+    try:
+        multipart.complete(row, parts)
+    except multipart.UploadError as e:
+        return HttpResponseBadRequest(str(e))
+    try:
+        att = _attach(request.user, app, doc_type, title, key, sha256)
+    except dedup.DedupError as e:
+        # The object exists now but nothing will reference it.
+        s3_gc.enqueue_keys([key])
+        return HttpResponseBadRequest(str(e))
+    return JsonResponse(_attachment_json(att))
+
+
+@login_required
+@require_POST
+def multipart_abort(request):
+    try:
+        data = json.loads(request.body.decode())
+        row = multipart.get(request.user, data["upload_id"])
+    except multipart.UploadError as e:
+        return HttpResponseBadRequest(str(e))
+    except Exception:
+        return HttpResponseBadRequest("bad payload")
+    multipart.abort(row)
+    return JsonResponse({"ok": True})
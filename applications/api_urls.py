@@ -4,4 +4,11 @@ from . import api
 urlpatterns = [
     path("presign/", api.create_presigned_post, name="api_presign"),
     path("finalize/", api.finalize_upload, name="api_finalize"),
+    path("presign/batch/", api.presign_batch, name="api_presign_batch"),
+    path("finalize/batch/", api.finalize_batch, name="api_finalize_batch"),
+    path("multipart/create/", api.multipart_create, name="api_multipart_create"),
+    path("multipart/sign/", api.multipart_sign_parts, name="api_multipart_sign"),
+    path("multipart/parts/", api.multipart_parts, name="api_multipart_parts"),
+    path("multipart/complete/", api.multipart_complete, name="api_multipart_complete"),
+    path("multipart/abort/", api.multipart_abort, name="api_multipart_abort"),
 ]
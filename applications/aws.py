@@ -0,0 +1,86 @@
+# applications/aws.py
+"""
+Per-process registry of boto3 clients/resources.
+
+Each client is built on first use and then shared by every request in the
+process (boto3 clients are thread-safe), so credential resolution, endpoint
+loading and the urllib3 pool are paid once and TLS connections stay warm.
+Resources are not thread-safe, so those are cached per thread instead. The
+registry is cleared in forked children so gunicorn workers never share a
+parent's sockets.
+"""
+
+import os
+import threading
+from typing import Any, Dict
+
+import boto3
+from botocore.config import Config
+
+REGION = os.getenv("AWS_S3_REGION_NAME", "ap-southeast-1")
+MAX_POOL_CONNECTIONS = int(os.getenv("APPMGR_AWS_MAX_POOL_CONNECTIONS", "20"))
+MAX_ATTEMPTS = int(os.getenv("APPMGR_AWS_MAX_ATTEMPTS", "3"))
+
+_lock = threading.Lock()
+_session = None
+_clients: Dict[str, Any] = {}
+_local = threading.local()
+
+
+def _reset() -> None:
+    global _lock, _session, _local
+    _lock = threading.Lock()
+    _session = None
+    _clients.clear()
+    _local = threading.local()
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+def _config() -> Config:
+    return Config(
+        region_name=REGION,
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=5,
+        read_timeout=30,
+        retries={"max_attempts": MAX_ATTEMPTS, "mode": "standard"},
+    )
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session(
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            aws_session_token=os.getenv("AWS_SESSION_TOKEN") or None,
+            region_name=REGION,
+        )
+    return _session
+
+
+def client(service: str):
+    """Shared low-level client, e.g. client("s3")."""
+    c = _clients.get(service)
+    if c is None:
+        with _lock:
+            c = _clients.get(service)
+            if c is None:
+                c = _get_session().client(service, config=_config())
+                _clients[service] = c
+    return c
+
+
+def resource(service: str):
+    """Per-thread resource, e.g. resource("dynamodb")."""
+    cache = getattr(_local, "resources", None)
+    if cache is None:
+        cache = _local.resources = {}
+    r = cache.get(service)
+    if r is None:
+        with _lock:
+            r = _get_session().resource(service, config=_config())
+        cache[service] = r
+    return r
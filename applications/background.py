@@ -0,0 +1,59 @@
+# applications/background.py
+"""
+Small in-process pool for work that must not hold up a request.
+
+Jobs are submitted only after the surrounding transaction commits, so they
+always see the rows that triggered them. Worker threads recycle their DB
+connections around each job the same way the request cycle does. The pool
+is rebuilt in forked children, as in aws.py.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from django.db import close_old_connections, transaction
+
+MAX_WORKERS = int(os.getenv("APPMGR_BACKGROUND_WORKERS", "2"))
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _reset() -> None:
+    global _lock, _executor
+    _lock = threading.Lock()
+    _executor = None
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=MAX_WORKERS, thread_name_prefix="appmgr-bg"
+                )
+    return _executor
+
+
+def _run(fn: Callable, args, kwargs) -> None:
+    close_old_connections()
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        log.exception("background job %s failed", getattr(fn, "__name__", fn))
+    finally:
+        close_old_connections()
+
+
+def submit_on_commit(fn: Callable, *args, **kwargs) -> None:
+    """Run fn(*args, **kwargs) on the pool once the current transaction commits."""
+    transaction.on_commit(lambda: _get_executor().submit(_run, fn, args, kwargs))
@@ -1,16 +1,27 @@
 # applications/ddb.py
 import os
+import uuid
 import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Mapping, Optional
 
-import boto3
 from botocore.exceptions import ClientError
+from django.core.cache import cache
+
+from . import aws
 
 REGION = os.getenv("AWS_S3_REGION_NAME", "ap-southeast-1")
 TABLE = os.getenv("APPMGR_DDB_TABLE", "emergency-hackathon")  # PK: username (S)
 
-_ddb = boto3.resource("dynamodb", region_name=REGION)
-_tbl = _ddb.Table(TABLE)
+# Keeps each UpdateExpression well under DynamoDB's 4 KB expression limit.
+BATCH_SIZE = 50
+# Reads are served from the shared Django cache for up to this many seconds;
+# every write below bumps the user's version key, so readers never see stale data
+# written through this module.
+CACHE_TTL = int(os.getenv("APPMGR_DDB_CACHE_TTL", "300"))
+
+
+def _table():
+    return aws.resource("dynamodb").Table(TABLE)
 
 
 def _now() -> str:
@@ -24,53 +35,110 @@ def _to_int(v: Any, default: int) -> int:
         return default
 
 
-def get_all_states(username: str) -> Dict[str, Dict[str, Any]]:
-    """Return { '<app_id>': {status, priority, updated_at}, ... } or {}."""
-    resp = _tbl.get_item(Key={"username": username})
+def _is_condition_failure(e: ClientError) -> bool:
+    code = (e.response.get("Error", {}) or {}).get("Code")
+    return code == "ConditionalCheckFailedException"
+
+
+def _version_key(username: str) -> str:
+    return f"ddb:ver:{username}"
+
+
+def _cache_version(username: str) -> str:
+    """
+    Current per-user version token. Tokens are random rather than counters so
+    an evicted version key can never resurrect an older cached item.
+    """
+    key = _version_key(username)
+    ver = cache.get(key)
+    if ver is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        ver = cache.get(key)
+    return ver
+
+
+def invalidate(username: str) -> None:
+    cache.set(_version_key(username), uuid.uuid4().hex, None)
+
+
+def _update_item(username: str, **kwargs) -> None:
+    _table().update_item(Key={"username": username}, **kwargs)
+    invalidate(username)
+
+
+def _fetch_states(username: str) -> Dict[str, Dict[str, Any]]:
+    resp = _table().get_item(Key={"username": username}, ConsistentRead=True)
     item = resp.get("Item") or {}
     apps = item.get("apps") or {}
     return apps if isinstance(apps, dict) else {}
 
 
+def get_all_states(username: str) -> Dict[str, Dict[str, Any]]:
+    """Return { '<app_id>': {status, priority, updated_at}, ... } or {}."""
+    key = f"ddb:states:{username}:{_cache_version(username)}"
+    states = cache.get(key)
+    if states is None:
+        states = _fetch_states(username)
+        cache.set(key, states, CACHE_TTL)
+    return states
+
+
 def get_state(username: str, app_id: int) -> Optional[Dict[str, Any]]:
     return get_all_states(username).get(str(app_id))
 
 
-def upsert_app_map(username: str, app_id: int, *, status: str, priority: int) -> None:
+def _write_children(username: str, children: Dict[str, Dict[str, Any]]) -> None:
     """
-    Safely set apps.<app_id> = {status, priority, updated_at}.
-    If 'apps' is missing/not a map, we create it first, then set the child.
+    Set apps.<id> = <value> for every entry in one update_item.
+    Only when the 'apps' map itself is missing (first write for a user) do we
+    fall back to seeding the whole map, guarded so a concurrent seed wins.
     """
-
-    def _set_child():
-        _tbl.update_item(
-            Key={"username": username},
-            UpdateExpression="SET #apps.#aid = :val, updated_at = :t",
-            ExpressionAttributeNames={"#apps": "apps", "#aid": str(app_id)},
-            ExpressionAttributeValues={
-                ":val": {
-                    "status": status,
-                    "priority": int(priority),
-                    "updated_at": _now(),
-                },
-                ":t": _now(),
-            },
+    names = {"#apps": "apps"}
+    values: Dict[str, Any] = {":t": _now()}
+    sets = []
+    for i, (aid, val) in enumerate(children.items()):
+        names[f"#a{i}"] = aid
+        values[f":v{i}"] = val
+        sets.append(f"#apps.#a{i} = :v{i}")
+    try:
+        _update_item(
+            username,
+            UpdateExpression="SET " + ", ".join(sets) + ", updated_at = :t",
+            ConditionExpression="attribute_exists(#apps)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
         )
-
+        return
+    except ClientError as e:
+        if not _is_condition_failure(e):
+            raise
     try:
-        _set_child()
+        _update_item(
+            username,
+            UpdateExpression="SET #apps = :seed, updated_at = :t",
+            ConditionExpression="attribute_not_exists(#apps)",
+            ExpressionAttributeNames={"#apps": "apps"},
+            ExpressionAttributeValues={":seed": dict(children), ":t": values[":t"]},
+        )
     except ClientError as e:
-        msg = (e.response.get("Error", {}) or {}).get("Message", "").lower()
-        if "document path" in msg or "invalid for update" in msg or "path" in msg:
-            _tbl.update_item(
-                Key={"username": username},
-                UpdateExpression="SET #apps = if_not_exists(#apps, :empty), updated_at = :t",
-                ExpressionAttributeNames={"#apps": "apps"},
-                ExpressionAttributeValues={":empty": {}, ":t": _now()},
-            )
-            _set_child()
-        else:
+        if not _is_condition_failure(e):
             raise
+        # Someone else created the map between our two calls; retry the child set.
+        _write_children(username, children)
+
+
+def upsert_app_map(username: str, app_id: int, *, status: str, priority: int) -> None:
+    """Set apps.<app_id> = {status, priority, updated_at} in a single round trip."""
+    _write_children(
+        username,
+        {
+            str(app_id): {
+                "status": status,
+                "priority": int(priority),
+                "updated_at": _now(),
+            }
+        },
+    )
 
 
 def put_state(username: str, app_id: int, status: str, priority: int) -> None:
@@ -80,40 +148,97 @@ def put_state(username: str, app_id: int, status: str, priority: int) -> None:
 def update_status(
     username: str, app_id: int, status: str, *, priority: Optional[int] = None
 ) -> None:
-    cur = get_state(username, app_id) or {}
-    pri = _to_int(cur.get("priority", 999) if priority is None else priority, 999)
-    upsert_app_map(username, app_id, status=status, priority=pri)
+    """
+    Touch only apps.<app_id>.status (and priority when given). If the child
+    does not exist yet, it is created with a default priority.
+    """
+    t = _now()
+    names = {"#apps": "apps", "#aid": str(app_id), "#st": "status"}
+    values: Dict[str, Any] = {":st": status, ":t": t}
+    sets = ["#apps.#aid.#st = :st", "#apps.#aid.updated_at = :t", "updated_at = :t"]
+    if priority is not None:
+        names["#pr"] = "priority"
+        values[":pr"] = _to_int(priority, 999)
+        sets.append("#apps.#aid.#pr = :pr")
+    try:
+        _update_item(
+            username,
+            UpdateExpression="SET " + ", ".join(sets),
+            ConditionExpression="attribute_exists(#apps.#aid)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except ClientError as e:
+        if not _is_condition_failure(e):
+            raise
+        upsert_app_map(
+            username, app_id, status=status, priority=_to_int(priority, 999)
+        )
+
+
+def update_priorities(username: str, priorities: Mapping[int, int]) -> None:
+    """
+    Set apps.<id>.priority for many applications at once, e.g. a whole
+    dashboard reorder. One update_item per BATCH_SIZE applications.
+    """
+    items = [(str(aid), int(p)) for aid, p in priorities.items()]
+    for start in range(0, len(items), BATCH_SIZE):
+        chunk = items[start : start + BATCH_SIZE]
+        t = _now()
+        names = {"#apps": "apps", "#pr": "priority"}
+        values: Dict[str, Any] = {":t": t}
+        sets, conds = [], []
+        for i, (aid, pri) in enumerate(chunk):
+            names[f"#a{i}"] = aid
+            values[f":p{i}"] = pri
+            sets.append(f"#apps.#a{i}.#pr = :p{i}")
+            sets.append(f"#apps.#a{i}.updated_at = :t")
+            conds.append(f"attribute_exists(#apps.#a{i})")
+        try:
+            _update_item(
+                username,
+                UpdateExpression="SET " + ", ".join(sets) + ", updated_at = :t",
+                ConditionExpression=" AND ".join(conds),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+            )
+        except ClientError as e:
+            if not _is_condition_failure(e):
+                raise
+            # Some children are missing (e.g. rows created before DynamoDB was
+            # wired up). Rebuild this chunk from the current item in one write.
+            states = _fetch_states(username)
+            children = {}
+            for aid, pri in chunk:
+                cur = states.get(aid) or {}
+                children[aid] = {
+                    "status": str(cur.get("status", "SUBMITTED")),
+                    "priority": pri,
+                    "updated_at": t,
+                }
+            _write_children(username, children)
 
 
 def update_priority(username: str, app_id: int, priority: int) -> None:
-    cur = get_state(username, app_id) or {}
-    st = str(cur.get("status", "SUBMITTED"))  # default normalized
-    upsert_app_map(username, app_id, status=st, priority=int(priority))
+    update_priorities(username, {app_id: priority})
 
 
 def delete_state(username: str, app_id: int) -> None:
     """
-    Remove apps.<app_id> if present; otherwise no-op.
-    Always touches updated_at. Guard with a condition to avoid ValidationException.
+    Remove apps.<app_id> and touch updated_at. No-op when the user has no
+    'apps' map yet (guarded to avoid a ValidationException on the path).
     """
-    names = {"#apps": "apps", "#aid": str(app_id)}
     try:
-        _tbl.update_item(
-            Key={"username": username},
+        _update_item(
+            username,
             UpdateExpression="REMOVE #apps.#aid SET updated_at = :t",
-            ConditionExpression="attribute_exists(#apps) AND attribute_exists(#apps.#aid)",
-            ExpressionAttributeNames=names,
+            ConditionExpression="attribute_exists(#apps)",
+            ExpressionAttributeNames={"#apps": "apps", "#aid": str(app_id)},
             ExpressionAttributeValues={":t": _now()},
         )
     except ClientError as e:
-        code = (e.response.get("Error", {}) or {}).get("Code")
-        if code != "ConditionalCheckFailedException":
+        if not _is_condition_failure(e):
             raise
-        _tbl.update_item(
-            Key={"username": username},
-            UpdateExpression="SET updated_at = :t",
-            ExpressionAttributeValues={":t": _now()},
-        )
 
 
 def overlay_states(username: str, app_objs: list) -> None:
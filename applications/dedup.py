@@ -0,0 +1,110 @@
+# applications/dedup.py
+"""
+Content-addressed uploads.
+
+The browser sends the sha256 of a file with its presign request. If the
+user already has an object with that hash, presign answers with its key
+and the browser skips the S3 POST; finalize then points the new Attachment
+at the existing object. New content is uploaded under a key derived from
+the hash. Each StoredObject counts the attachments that reference it, and
+the object is only tombstoned when the last one is deleted.
+
+Hashes are scoped per user: a wrong hash from a client can only make that
+user's own attachments point at the wrong bytes.
+"""
+
+import re
+import uuid
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Attachment, S3Tombstone, StoredObject
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class DedupError(ValueError):
+    """The finalize payload does not describe a usable content-addressed key."""
+
+
+def normalize(sha256) -> str:
+    """Lower-case hex digest, or "" if sha256 is not a sha256 digest."""
+    sha256 = (sha256 or "").strip().lower()
+    return sha256 if SHA256_RE.match(sha256) else ""
+
+
+def user_prefix(user) -> str:
+    return user.username.replace("/", "-")
+
+
+def owns_key(user, key: str) -> bool:
+    """Whether key lies under user's prefix, i.e. the app issued it to them."""
+    return isinstance(key, str) and key.startswith(f"{user_prefix(user)}/")
+
+
+def content_key(user, sha256: str, filename: str) -> str:
+    # Unique per upload: re-uploading content whose previous object is still
+    # queued for deletion must not land on the tombstoned key.
+    token = uuid.uuid4().hex[:12]
+    return f"{user_prefix(user)}/objects/{sha256}/{token}_{filename}"
+
+
+def find(user, sha256: str) -> Optional[StoredObject]:
+    return StoredObject.objects.filter(user=user, sha256=sha256).first()
+
+
+def acquire(user, sha256: str, key: str, refs: int = 1) -> StoredObject:
+    """
+    Take refs references on the user's object for sha256, recording key as
+    that object if it is new. Call inside the transaction that saves the
+    Attachments.
+    """
+    from . import s3_gc
+
+    own_key = key.startswith(f"{user_prefix(user)}/objects/{sha256}/")
+    with transaction.atomic():
+        obj = (
+            StoredObject.objects.select_for_update()
+            .filter(user=user, sha256=sha256)
+            .first()
+        )
+        if obj is None:
+            if not own_key:
+                raise DedupError("key does not match sha256")
+            # The last reference may have been dropped between presign and
+            # finalize; its object is then already queued for deletion.
+            if S3Tombstone.objects.filter(key=key).exists():
+                raise DedupError("object was deleted; upload it again")
+            obj, _ = StoredObject.objects.get_or_create(
+                user=user, sha256=sha256, defaults={"key": key}
+            )
+        if (
+            own_key
+            and key != obj.key
+            and not Attachment.objects.filter(file=key).exists()
+            and not S3Tombstone.objects.filter(key=key).exists()
+        ):
+            # Two presigns for this hash raced and both objects were
+            # uploaded; the first one finalized is kept and this one is spare.
+            s3_gc.enqueue_keys([key])
+        StoredObject.objects.filter(pk=obj.pk).update(ref_count=F("ref_count") + refs)
+    return obj
+
+
+def release(stored_object_id: int) -> None:
+    """
+    Drop one reference. Dropping the last deletes the row, and the
+    post_delete handler in signals.py tombstones the object.
+    """
+    with transaction.atomic():
+        obj = (
+            StoredObject.objects.select_for_update().filter(pk=stored_object_id).first()
+        )
+        if obj is None:
+            return
+        if obj.ref_count <= 1:
+            obj.delete()
+        else:
+            StoredObject.objects.filter(pk=obj.pk).update(ref_count=F("ref_count") - 1)
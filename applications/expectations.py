@@ -0,0 +1,141 @@
+# applications/expectations.py
+"""
+Shared, precomputed SOP-expectation research per (college, program).
+
+Creating an Application schedules a background Tavily search for its
+college/program. The digest is stored once per normalised pair and reused
+by every user, then refreshed after REFRESH_TTL. The SOP assistant injects
+the stored digest into its prompt, so live browsing stays off the path to
+the first token.
+"""
+
+import datetime
+import logging
+import os
+import threading
+from typing import Optional, Tuple
+
+from django.db import IntegrityError
+from django.utils import timezone
+
+from . import background
+from .models import ProgramExpectation
+
+REFRESH_TTL = datetime.timedelta(
+    seconds=int(os.getenv("APPMGR_EXPECTATIONS_TTL", str(14 * 24 * 3600)))
+)
+MAX_BACKOFF = datetime.timedelta(hours=6)
+MAX_RESULTS = 5
+SNIPPET_CHARS = 300
+
+log = logging.getLogger(__name__)
+
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def normalize(college: str, program: str) -> Tuple[str, str]:
+    def norm(s: str) -> str:
+        return " ".join((s or "").casefold().split())[:255]
+
+    return norm(college), norm(program)
+
+
+def research(college: str, program: str) -> str:
+    """One Tavily search, formatted as a markdown bullet digest."""
+    api_key = os.getenv("TAVILY_API_KEY")
+    if not api_key:
+        raise RuntimeError("TAVILY_API_KEY not set")
+    from tavily import TavilyClient
+
+    tv = TavilyClient(api_key=api_key)
+    q = f"what do admissions committees at {college} look for in a Statement of Purpose for {program}? key components, common pitfalls, recommended structure"
+    res = tv.search(q, max_results=MAX_RESULTS)
+    bullets = []
+    for item in res.get("results", [])[:MAX_RESULTS]:
+        title = item.get("title", "")
+        content = item.get("content", "")
+        bullets.append(f"- {title}: {content[:SNIPPET_CHARS]}...")
+    return "Web research highlights:\n" + "\n".join(bullets) if bullets else ""
+
+
+def enabled() -> bool:
+    return bool(os.getenv("TAVILY_API_KEY"))
+
+
+def is_due(row: ProgramExpectation) -> bool:
+    return row.available_at <= timezone.now()
+
+
+def _backoff(attempts: int) -> datetime.timedelta:
+    return min(datetime.timedelta(minutes=2**attempts), MAX_BACKOFF)
+
+
+def refresh(college: str, program: str, force: bool = False) -> bool:
+    """
+    Fetch and store the digest for (college, program) if it is due (or
+    force). Returns True when a new digest was stored.
+    """
+    ck, pk = normalize(college, program)
+    if not (ck and pk):
+        return False
+    with _inflight_lock:
+        if (ck, pk) in _inflight:
+            return False
+        _inflight.add((ck, pk))
+    try:
+        try:
+            row, _ = ProgramExpectation.objects.get_or_create(
+                college_key=ck,
+                program_key=pk,
+                defaults={"college": college.strip(), "program": program.strip()},
+            )
+        except IntegrityError:
+            row = ProgramExpectation.objects.get(college_key=ck, program_key=pk)
+        if not force and not is_due(row):
+            return False
+        try:
+            digest = research(row.college, row.program)
+        except Exception as e:
+            log.warning("expectation research for %s/%s failed: %s", ck, pk, e)
+            ProgramExpectation.objects.filter(pk=row.pk).update(
+                attempts=row.attempts + 1,
+                available_at=timezone.now() + _backoff(row.attempts + 1),
+                last_error=str(e)[:2000],
+            )
+            return False
+        now = timezone.now()
+        ProgramExpectation.objects.filter(pk=row.pk).update(
+            digest=digest,
+            fetched_at=now,
+            available_at=now + REFRESH_TTL,
+            attempts=0,
+            last_error="",
+        )
+        return True
+    finally:
+        with _inflight_lock:
+            _inflight.discard((ck, pk))
+
+
+def schedule(college: str, program: str) -> None:
+    """Refresh (college, program) in the background after commit."""
+    if enabled() and all(normalize(college, program)):
+        background.submit_on_commit(refresh, college, program)
+
+
+def get_digest(college: str, program: str) -> Optional[str]:
+    """
+    Stored digest for (college, program), or None if there is none yet. A
+    digest that is due for refresh is still returned, and a refresh is
+    scheduled.
+    """
+    ck, pk = normalize(college, program)
+    if not (ck and pk):
+        return None
+    row = ProgramExpectation.objects.filter(college_key=ck, program_key=pk).first()
+    if row is None or is_due(row):
+        schedule(college, program)
+    if row is None or not row.digest:
+        return None
+    return row.digest
@@ -0,0 +1,83 @@
+# applications/extract.py
+"""
+Text extraction from uploaded SOP files.
+
+extract_text() parses incrementally (PDF page by page, DOCX paragraph by
+paragraph) and stops as soon as max_chars of text have been collected, so
+long appendices or portfolio pages that would never reach the model are
+never laid out.
+"""
+
+import io
+import os
+from typing import Iterator, NamedTuple, Optional
+
+# Long SOPs are chunked for analysis (see sop_analysis.py); this bounds the
+# work, not the prompt.
+MAX_CHARS = int(os.getenv("APPMGR_EXTRACT_MAX_CHARS", "70000"))
+
+
+class Extracted(NamedTuple):
+    text: str
+    truncated: bool
+    # Whole-document page count where the format has pages (PDF only).
+    pages: Optional[int] = None
+
+
+def _pdf_pages(data: bytes) -> Iterator[str]:
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+
+    for page in extract_pages(io.BytesIO(data)):
+        parts = [el.get_text() for el in page if isinstance(el, LTTextContainer)]
+        yield "".join(parts) + "\f"
+
+
+def _pdf_page_count(data: bytes) -> Optional[int]:
+    # /Count of the root page tree; no page content is parsed.
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    try:
+        doc = PDFDocument(PDFParser(io.BytesIO(data)))
+        return int(resolve1(resolve1(doc.catalog["Pages"])["Count"]))
+    except Exception:
+        return None
+
+
+def _docx_paragraphs(data: bytes) -> Iterator[str]:
+    from docx import Document as Docx
+
+    d = Docx(io.BytesIO(data))
+    for i, p in enumerate(d.paragraphs):
+        yield p.text if i == 0 else "\n" + p.text
+
+
+def _take(pieces: Iterator[str], max_chars: Optional[int]) -> Extracted:
+    out = []
+    n = 0
+    for piece in pieces:
+        if max_chars is not None and n + len(piece) >= max_chars:
+            out.append(piece[: max_chars - n])
+            # Anything left in this piece or after it is dropped unparsed.
+            truncated = n + len(piece) > max_chars or next(pieces, None) is not None
+            return Extracted("".join(out), truncated)
+        out.append(piece)
+        n += len(piece)
+    return Extracted("".join(out), False)
+
+
+def extract_text(
+    filename, data: bytes, max_chars: Optional[int] = MAX_CHARS
+) -> Extracted:
+    """
+    Text of an uploaded file, parsed only as far as max_chars (None for the
+    whole document). truncated is True when content was left out.
+    """
+    name = (filename or "").lower()
+    if name.endswith(".docx"):
+        return _take(_docx_paragraphs(data), max_chars)
+    if name.endswith(".pdf"):
+        return _take(_pdf_pages(data), max_chars)._replace(pages=_pdf_page_count(data))
+    return _take(iter([data.decode("utf-8", errors="ignore")]), max_chars)
@@ -0,0 +1,166 @@
+# applications/extract_pool.py
+"""
+Bounded process pool for text extraction.
+
+pdfminer and python-docx are pure-Python and hold the GIL, so parsing runs
+in a small forkserver pool instead of the request worker. Each job has a
+wall-clock limit (enforced in the child with SIGALRM, and in the parent by
+killing the pool if the child stops responding), each child has an address
+space cap, and at most MAX_PENDING jobs may be running or queued per
+process. Past that, callers get ExtractorBusy straight away instead of
+waiting.
+
+No Django imports here: the forkserver children import this module.
+"""
+
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from .extract import MAX_CHARS, Extracted, extract_text as _extract_inline
+
+WORKERS = int(os.getenv("APPMGR_EXTRACT_WORKERS", "1"))  # 0 = parse inline
+MAX_PENDING = int(os.getenv("APPMGR_EXTRACT_MAX_PENDING", "4"))
+TIMEOUT = float(os.getenv("APPMGR_EXTRACT_TIMEOUT", "30"))
+MEMORY_MB = int(os.getenv("APPMGR_EXTRACT_MEMORY_MB", "512"))
+# Extra time the parent allows before treating a child as hung.
+GRACE = 5.0
+
+
+class ExtractorBusy(RuntimeError):
+    """All extraction slots are taken; retry later."""
+
+
+class ExtractionFailed(RuntimeError):
+    """The document could not be parsed within the time/memory limits."""
+
+
+class _Timeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _Timeout
+
+
+def _init_worker(memory_mb: int) -> None:
+    signal.signal(signal.SIGALRM, _on_alarm)
+    if memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _job(filename, data: bytes, max_chars: Optional[int], timeout: float):
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return _extract_inline(filename, data, max_chars)
+    except _Timeout:
+        raise ExtractionFailed(f"extraction took longer than {timeout:g}s") from None
+    except MemoryError:
+        raise ExtractionFailed(f"extraction exceeded {MEMORY_MB} MB") from None
+    except Exception as e:
+        raise ExtractionFailed(f"could not parse {filename}: {e}") from None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_slots = threading.BoundedSemaphore(max(MAX_PENDING, 1))
+
+
+def _reset() -> None:
+    global _lock, _pool, _slots
+    _lock = threading.Lock()
+    _pool = None
+    _slots = threading.BoundedSemaphore(max(MAX_PENDING, 1))
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                ctx = multiprocessing.get_context("forkserver")
+                # Children start from a server that already imported the
+                # parsers (extract.py itself imports them lazily).
+                ctx.set_forkserver_preload(
+                    ["applications.extract_pool", "docx", "pdfminer.high_level"]
+                )
+                _pool = ProcessPoolExecutor(
+                    max_workers=WORKERS,
+                    mp_context=ctx,
+                    initializer=_init_worker,
+                    initargs=(MEMORY_MB,),
+                )
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor, kill: bool = False) -> None:
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    if kill:
+        # A child stuck in C code ignores SIGALRM; there is no public API to
+        # stop one job, so take the pool down with it.
+        for proc in list((getattr(pool, "_processes", None) or {}).values()):
+            proc.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _wait_limit() -> float:
+    # Queued jobs wait behind at most this many timeouts' worth of work.
+    rounds = -(-max(MAX_PENDING, 1) // max(WORKERS, 1))
+    return TIMEOUT * rounds + GRACE
+
+
+def extract_text(
+    filename, data: bytes, max_chars: Optional[int] = MAX_CHARS, wait: float = 0
+) -> Extracted:
+    """
+    extract.extract_text() run in the pool. Raises ExtractorBusy when
+    MAX_PENDING jobs are already in flight (after waiting up to wait seconds
+    for one to finish; background callers can afford to) and
+    ExtractionFailed when the document cannot be parsed within the limits.
+    """
+    if WORKERS <= 0:
+        return _extract_inline(filename, data, max_chars)
+    if wait > 0:
+        acquired = _slots.acquire(timeout=wait)
+    else:
+        acquired = _slots.acquire(blocking=False)
+    if not acquired:
+        raise ExtractorBusy("text extraction is busy")
+    try:
+        for attempt in (1, 2):
+            pool = _get_pool()
+            try:
+                fut = pool.submit(_job, filename, data, max_chars, TIMEOUT)
+                return fut.result(timeout=_wait_limit())
+            except ExtractionFailed:
+                raise
+            except FutureTimeout:
+                _discard_pool(pool, kill=True)
+                raise ExtractionFailed(f"extraction of {filename} timed out") from None
+            except BrokenProcessPool:
+                _discard_pool(pool)
+                raise ExtractionFailed("extraction worker died") from None
+            except (CancelledError, RuntimeError):
+                # Another caller discarded this pool before the job ran: the
+                # job was cancelled, or submit() found the pool shut down.
+                # Nothing was parsed, so try once more on a fresh pool.
+                _discard_pool(pool)
+                if attempt == 2:
+                    raise ExtractionFailed("extraction pool restarted") from None
+    finally:
+        _slots.release()
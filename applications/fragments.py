@@ -0,0 +1,49 @@
+# applications/fragments.py
+"""
+Version stamps for cached dashboard fragments.
+
+Each user has a stamp that changes whenever one of their applications is
+created, changed, reordered or deleted; notifications share one global stamp
+bumped on ingest. Rendered fragments and the dashboard ETag are keyed by these
+stamps, so nothing needs explicit invalidation. Bumps run on commit, so a
+concurrent render can never cache pre-commit data under the new stamp.
+"""
+
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+NOTIFICATIONS_KEY = "dash:stamp:notifs"
+
+
+def _user_key(user_id: int) -> str:
+    return f"dash:stamp:user:{user_id}"
+
+
+def _stamp(key: str) -> str:
+    val = cache.get(key)
+    if val is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        val = cache.get(key)
+    return val
+
+
+def _bump(key: str) -> None:
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def user_stamp(user_id: int) -> str:
+    return _stamp(_user_key(user_id))
+
+
+def notifications_stamp() -> str:
+    return _stamp(NOTIFICATIONS_KEY)
+
+
+def bump_user(user_id: int) -> None:
+    _bump(_user_key(user_id))
+
+
+def bump_notifications() -> None:
+    _bump(NOTIFICATIONS_KEY)
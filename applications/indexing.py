@@ -0,0 +1,72 @@
+# applications/indexing.py
+"""
+Attachment text indexing.
+
+Finalizing an upload schedules index_attachment() on the background pool.
+It downloads and parses the object once, then stores the text with page,
+word and token counts as an AttachmentText row. Readers call
+attachment_text(), which returns that row and only falls back to parsing
+inline when indexing has not finished yet.
+"""
+
+import logging
+
+from . import background
+from .models import Attachment, AttachmentText
+from .text_cache import get_attachment_text
+
+log = logging.getLogger(__name__)
+
+# Background jobs may wait this long for an extraction slot.
+SLOT_WAIT = 120.0
+
+
+def _store(att, extracted) -> AttachmentText:
+    from .sop_analysis import count_tokens
+
+    text = extracted.text
+    row, _ = AttachmentText.objects.update_or_create(
+        attachment=att,
+        defaults={
+            "status": "ready",
+            "text": text,
+            "truncated": extracted.truncated,
+            "page_count": extracted.pages,
+            "word_count": len(text.split()),
+            "token_count": count_tokens(text),
+            "error": "",
+        },
+    )
+    return row
+
+
+def index_attachment(attachment_id: int) -> None:
+    att = Attachment.objects.filter(pk=attachment_id).first()
+    if att is None or not att.file:
+        return
+    try:
+        extracted = get_attachment_text(att, wait=SLOT_WAIT)
+    except RuntimeError as e:  # S3 errors, ExtractionFailed, ExtractorBusy
+        log.warning("indexing attachment %s failed: %s", attachment_id, e)
+        AttachmentText.objects.update_or_create(
+            attachment=att, defaults={"status": "failed", "error": str(e)[:2000]}
+        )
+        return
+    _store(att, extracted)
+
+
+def schedule(att) -> None:
+    """Index att in the background once the current transaction commits."""
+    background.submit_on_commit(index_attachment, att.pk)
+
+
+def attachment_text(att) -> AttachmentText:
+    """
+    Indexed text of att. If the background job has not produced a ready row
+    yet, extract inline (may raise ExtractorBusy / ExtractionFailed) and
+    store the result.
+    """
+    row = AttachmentText.objects.filter(attachment=att, status="ready").first()
+    if row is not None:
+        return row
+    return _store(att, get_attachment_text(att))
@@ -0,0 +1,322 @@
+# applications/mail_sync.py
+"""
+Incremental IMAP ingestion into Notification.
+
+Each mailbox has a MailboxCheckpoint (UIDVALIDITY and the last UID read).
+A sync asks the server only for UIDs above the checkpoint and fetches them
+in batches of FETCH_BATCH with a single FETCH each: a few header fields
+plus the first SNIPPET_BYTES of the body (BODY.PEEK, so nothing is marked
+seen and attachments are never downloaded). Rows are deduplicated on
+Message-ID and written with one bulk_create per batch, in the same
+transaction that advances the checkpoint.
+
+The first sync of a mailbox (or one whose UIDVALIDITY changed) takes only
+the unseen messages, as the old full scan did, and starts the checkpoint
+from there.
+
+watch() keeps one IMAP IDLE connection per mailbox so new mail is ingested
+within seconds of arrival instead of on the next cron run.
+"""
+
+import datetime
+import email
+import email.utils
+import logging
+import os
+import threading
+import time
+from email.header import decode_header, make_header
+from typing import Dict, Iterable, List, Optional
+
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import fragments, search
+from .models import MailboxCheckpoint, Notification
+
+log = logging.getLogger(__name__)
+
+MAILBOXES = ("INBOX", "Junk", "Spam")
+FETCH_BATCH = int(os.getenv("APPMGR_IMAP_FETCH_BATCH", "200"))
+# watch(): IDLE is re-issued every IDLE_RENEW seconds (servers drop it after
+# 30 minutes, NAT boxes often sooner) and polled every IDLE_CHECK seconds so
+# a stop request is noticed well inside Fly's 5 s kill timeout.
+IDLE_RENEW = int(os.getenv("APPMGR_IMAP_IDLE_RENEW", "300"))
+IDLE_CHECK = 2
+MAX_BACKOFF = 300
+SNIPPET_BYTES = 2048
+SNIPPET_CHARS = 500
+HEADER_FIELDS = "SUBJECT DATE MESSAGE-ID CONTENT-TYPE CONTENT-TRANSFER-ENCODING"
+FETCH_ITEMS = [
+    f"BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})]",
+    f"BODY.PEEK[TEXT]<0.{SNIPPET_BYTES}>",
+]
+
+
+def settings() -> Optional[dict]:
+    host = os.getenv("APPMGR_IMAP_HOST")
+    user = os.getenv("APPMGR_IMAP_USER")
+    pwd = os.getenv("APPMGR_IMAP_PASS")
+    if not all([host, user, pwd]):
+        return None
+    return {"host": host, "user": user, "password": pwd}
+
+
+def account_name(conf: dict) -> str:
+    return f"{conf['user']}@{conf['host']}"
+
+
+def connect(conf: dict):
+    from imapclient import IMAPClient
+
+    client = IMAPClient(conf["host"], ssl=True, timeout=60)
+    client.login(conf["user"], conf["password"])
+    return client
+
+
+# --- parsing ------------------------------------------------------------------
+
+
+def _item(data: dict, prefix: bytes) -> bytes:
+    # Servers echo section names in their own spelling; match on the prefix.
+    for k, v in data.items():
+        if isinstance(k, bytes) and k.upper().startswith(prefix):
+            return v or b""
+    return b""
+
+
+def _decode(value: str) -> str:
+    try:
+        return str(make_header(decode_header(value or "")))
+    except Exception:
+        return value or ""
+
+
+def _snippet(msg) -> str:
+    # The body is cut at SNIPPET_BYTES, so decoding may hit a torn boundary
+    # or base64 group; take whatever text comes out.
+    for part in msg.walk() if msg.is_multipart() else [msg]:
+        if part.get_content_type() != "text/plain":
+            continue
+        try:
+            payload = part.get_payload(decode=True) or b""
+        except Exception:
+            payload = str(part.get_payload()).encode("utf-8", "ignore")
+        charset = part.get_content_charset() or "utf-8"
+        try:
+            text = payload.decode(charset, errors="ignore")
+        except LookupError:
+            text = payload.decode("utf-8", errors="ignore")
+        return text.strip()[:SNIPPET_CHARS]
+    return ""
+
+
+def parse(data: dict, mailbox: str) -> Notification:
+    """A (not yet saved) Notification from one FETCH response."""
+    header = _item(data, b"BODY[HEADER")
+    body = _item(data, b"BODY[TEXT]")
+    msg = email.message_from_bytes(header.rstrip(b"\r\n") + b"\r\n\r\n" + body)
+    try:
+        received_at = datetime.datetime.fromtimestamp(
+            email.utils.mktime_tz(email.utils.parsedate_tz(msg.get("Date"))),
+            tz=datetime.timezone.utc,
+        )
+    except Exception:
+        received_at = timezone.now()
+    subject = _decode(msg.get("Subject", "")).strip()
+    return Notification(
+        source=mailbox,
+        subject=(subject or "(no subject)")[:512],
+        snippet=_snippet(msg),
+        received_at=received_at,
+        message_id=(msg.get("Message-ID") or "").strip()[:512],
+    )
+
+
+# --- sync ---------------------------------------------------------------------
+
+
+def _new_rows(rows: List[Notification]) -> List[Notification]:
+    """Drop rows whose Message-ID is already stored or repeated in rows."""
+    ids = {r.message_id for r in rows if r.message_id}
+    seen = set(
+        Notification.objects.filter(message_id__in=ids).values_list(
+            "message_id", flat=True
+        )
+    )
+    out = []
+    for r in rows:
+        if r.message_id:
+            if r.message_id in seen:
+                continue
+            seen.add(r.message_id)
+        out.append(r)
+    return out
+
+
+def _store(rows: List[Notification], checkpoint: MailboxCheckpoint, last_uid: int):
+    """Insert rows and advance the checkpoint together. Returns rows inserted."""
+    for attempt in (1, 2):
+        try:
+            with transaction.atomic():
+                fresh = _new_rows(rows)
+                created = Notification.objects.bulk_create(fresh)
+                # bulk_create sends no post_save: index and bump here.
+                search.add_many(search.notification_entry(n) for n in created)
+                if created:
+                    fragments.bump_notifications()
+                checkpoint.last_uid = last_uid
+                checkpoint.save(update_fields=["last_uid", "updated_at"])
+            return len(created)
+        except IntegrityError:
+            # Another worker stored one of these Message-IDs meanwhile.
+            if attempt == 2:
+                raise
+    return 0
+
+
+def _checkpoint(account: str, mailbox: str, uidvalidity: int):
+    """(checkpoint, is_new); is_new also when UIDVALIDITY changed."""
+    cp, created = MailboxCheckpoint.objects.get_or_create(
+        account=account, mailbox=mailbox, defaults={"uidvalidity": uidvalidity}
+    )
+    if not created and cp.uidvalidity != uidvalidity:
+        log.info("%s/%s: UIDVALIDITY changed, restarting", account, mailbox)
+        cp.uidvalidity = uidvalidity
+        cp.last_uid = 0
+        cp.save(update_fields=["uidvalidity", "last_uid", "updated_at"])
+        created = True
+    return cp, created
+
+
+def sync_mailbox(client, account: str, mailbox: str) -> int:
+    """Ingest what arrived in mailbox since its checkpoint. Returns rows added."""
+    info = client.select_folder(mailbox, readonly=True)
+    uidvalidity = int(info[b"UIDVALIDITY"])
+    uidnext = int(info.get(b"UIDNEXT") or 0)
+    cp, is_new = _checkpoint(account, mailbox, uidvalidity)
+
+    if is_new:
+        uids = sorted(client.search("UNSEEN"))
+        start = max(uidnext - 1, max(uids, default=0))
+    else:
+        if uidnext and uidnext <= cp.last_uid + 1:
+            return 0
+        # "N:*" always matches the newest message, even below N.
+        uids = sorted(
+            u for u in client.search(["UID", f"{cp.last_uid + 1}:*"]) if u > cp.last_uid
+        )
+        start = cp.last_uid
+
+    n = 0
+    for i in range(0, len(uids), FETCH_BATCH):
+        batch = uids[i : i + FETCH_BATCH]
+        resp = client.fetch(batch, FETCH_ITEMS)
+        missing = [uid for uid in batch if uid not in resp]
+        if missing:
+            # Expunged mid-fetch or a partial reply; the checkpoint still
+            # moves past them, so say which ones were skipped.
+            log.warning(
+                "%s/%s: no FETCH data for UIDs %s, skipping",
+                account,
+                mailbox,
+                ",".join(map(str, missing)),
+            )
+        rows = [parse(resp[uid], mailbox) for uid in batch if uid in resp]
+        n += _store(rows, cp, max(batch[-1], cp.last_uid))
+    if start > cp.last_uid:
+        cp.last_uid = start
+        cp.save(update_fields=["last_uid", "updated_at"])
+    return n
+
+
+def _logout(client) -> None:
+    try:
+        client.logout()
+    except Exception:
+        pass
+
+
+def sync_all(conf: dict, mailboxes: Iterable[str] = MAILBOXES) -> Dict[str, int]:
+    """One pass over mailboxes on one connection. Returns rows added per box."""
+    account = account_name(conf)
+    client = connect(conf)
+    counts = {}
+    try:
+        for mailbox in mailboxes:
+            try:
+                counts[mailbox] = sync_mailbox(client, account, mailbox)
+            except client.Error as e:
+                # Mailbox missing on this server (e.g. no "Spam" folder).
+                log.info("skipping %s: %s", mailbox, e)
+    finally:
+        _logout(client)
+    return counts
+
+
+# --- watch (IMAP IDLE) --------------------------------------------------------
+# One thread and one connection per mailbox: IDLE only reports on the
+# selected folder. Each wakeup is one sync_mailbox(), which is a single
+# SELECT when nothing new arrived.
+
+
+def _idle_once(client, stop: threading.Event) -> None:
+    """Block in IDLE until new mail, stop, or IDLE_RENEW seconds elapse."""
+    client.idle()
+    try:
+        deadline = time.monotonic() + IDLE_RENEW
+        while not stop.is_set() and time.monotonic() < deadline:
+            responses = client.idle_check(timeout=IDLE_CHECK)
+            if any(len(r) > 1 and r[1] in (b"EXISTS", b"RECENT") for r in responses):
+                return
+    finally:
+        client.idle_done()
+
+
+def watch_mailbox(conf: dict, mailbox: str, stop: threading.Event) -> None:
+    """
+    Keep mailbox ingested until stop is set: sync, IDLE, sync on wakeup.
+    Connection errors reconnect after an exponential backoff capped at
+    MAX_BACKOFF; a mailbox the server does not have ends the watch.
+    """
+    account = account_name(conf)
+    delay = 1.0
+    while not stop.is_set():
+        client = None
+        try:
+            client = connect(conf)
+            if not client.folder_exists(mailbox):
+                log.info("%s: no such mailbox, not watching", mailbox)
+                return
+            while not stop.is_set():
+                close_old_connections()
+                n = sync_mailbox(client, account, mailbox)
+                if n:
+                    log.info("%s: ingested %d", mailbox, n)
+                delay = 1.0
+                _idle_once(client, stop)
+        except Exception as e:
+            log.warning("%s: %s; reconnecting in %.0fs", mailbox, e, delay)
+            stop.wait(delay)
+            delay = min(delay * 2, MAX_BACKOFF)
+        finally:
+            if client is not None:
+                _logout(client)
+            close_old_connections()
+
+
+def watch(conf: dict, mailboxes: Iterable[str], stop: threading.Event) -> None:
+    """Watch every mailbox concurrently; returns once stop is set."""
+    threads = [
+        threading.Thread(
+            target=watch_mailbox,
+            args=(conf, mailbox, stop),
+            name=f"imap-{mailbox}",
+            daemon=True,
+        )
+        for mailbox in mailboxes
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
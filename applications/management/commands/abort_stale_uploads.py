@@ -0,0 +1,22 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand
+from applications import multipart
+
+
+class Command(BaseCommand):
+    help = "Abort S3 multipart uploads that were started but never completed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-age-hours", type=float, default=24.0)
+        parser.add_argument("--loop", action="store_true", help="Keep sweeping.")
+        parser.add_argument("--interval", type=float, default=3600.0)
+
+    def handle(self, *args, **opts):
+        max_age = datetime.timedelta(hours=opts["max_age_hours"])
+        while True:
+            n = multipart.sweep(max_age)
+            self.stdout.write(self.style.SUCCESS(f"Aborted {n} stale uploads"))
+            if not opts["loop"]:
+                return
+            time.sleep(opts["interval"])
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from applications import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Relay pending application-state writes from the outbox to the state backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep draining.")
+        parser.add_argument("--interval", type=float, default=1.0)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--retry-dead",
+            action="store_true",
+            help="Requeue rows that exhausted their attempts, then drain.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["retry_dead"]:
+            n = outbox.retry_dead()
+            self.stdout.write(f"Requeued {n} dead outbox rows")
+        while True:
+            n = outbox.drain(batch_size=opts["batch_size"])
+            if n:
+                self.stdout.write(self.style.SUCCESS(f"Relayed {n} outbox rows"))
+            if not opts["loop"]:
+                return
+            if n < opts["batch_size"]:
+                time.sleep(opts["interval"])
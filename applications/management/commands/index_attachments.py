@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from applications import indexing
+from applications.models import Attachment
+
+
+class Command(BaseCommand):
+    help = (
+        "Extract and index text for attachments that have no ready AttachmentText row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also retry attachments whose last indexing attempt failed.",
+        )
+
+    def handle(self, *args, **opts):
+        todo = Attachment.objects.filter(extracted__isnull=True)
+        if opts["retry_failed"]:
+            todo = Attachment.objects.exclude(extracted__status="ready")
+        n = 0
+        for att_id in todo.order_by("id").values_list("id", flat=True):
+            indexing.index_attachment(att_id)
+            n += 1
+        self.stdout.write(self.style.SUCCESS(f"Indexed {n} attachments"))
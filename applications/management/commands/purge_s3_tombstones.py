@@ -0,0 +1,31 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand
+from applications import s3_gc
+
+
+class Command(BaseCommand):
+    help = "Delete S3 objects queued by attachment deletions, in 1000-key batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep purging.")
+        parser.add_argument("--interval", type=float, default=10.0)
+        parser.add_argument(
+            "--reconcile",
+            action="store_true",
+            help="First enqueue bucket objects no row references.",
+        )
+        parser.add_argument("--grace-hours", type=float, default=24.0)
+
+    def handle(self, *args, **opts):
+        if opts["reconcile"]:
+            n = s3_gc.reconcile(datetime.timedelta(hours=opts["grace_hours"]))
+            self.stdout.write(self.style.SUCCESS(f"Queued {n} orphaned objects"))
+        while True:
+            n = s3_gc.purge()
+            if n:
+                self.stdout.write(self.style.SUCCESS(f"Deleted {n} objects"))
+            if n < s3_gc.BATCH_SIZE:
+                if not opts["loop"]:
+                    return
+                time.sleep(opts["interval"])
@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.db.models.functions import Length
+from applications import ranking
+
+
+class Command(BaseCommand):
+    help = "Respace application rank keys for users whose keys have grown too long."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rebalance every user.")
+        parser.add_argument("--max-length", type=int, default=ranking.MAX_KEY_LENGTH)
+
+    def handle(self, *args, **opts):
+        users = get_user_model().objects.all()
+        if not opts["all"]:
+            users = users.annotate(longest=Max(Length("application__rank"))).filter(
+                longest__gt=opts["max_length"]
+            )
+        for user in users:
+            n = ranking.rebalance_user(user)
+            self.stdout.write(self.style.SUCCESS(f"Rebalanced {n} for {user}"))
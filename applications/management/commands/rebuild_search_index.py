@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from applications import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from applications, documents, attachment text and notifications."
+
+    def handle(self, *args, **opts):
+        n = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {n} search entries"))
@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand
+from applications import expectations
+from applications.models import Application
+
+
+class Command(BaseCommand):
+    help = (
+        "Fetch or refresh SOP-expectation research for every (college, program) in use."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Refresh even if not yet due."
+        )
+        parser.add_argument("--loop", action="store_true", help="Keep refreshing.")
+        parser.add_argument("--interval", type=float, default=3600.0)
+
+    def handle(self, *args, **opts):
+        if not expectations.enabled():
+            self.stderr.write("TAVILY_API_KEY not set; nothing to do.")
+            return
+        while True:
+            pairs = {}
+            for college, program in (
+                Application.objects.exclude(college_name="")
+                .exclude(program_name="")
+                .values_list("college_name", "program_name")
+                .distinct()
+            ):
+                pairs.setdefault(
+                    expectations.normalize(college, program), (college, program)
+                )
+            n = 0
+            for college, program in pairs.values():
+                if expectations.refresh(college, program, force=opts["force"]):
+                    n += 1
+            self.stdout.write(self.style.SUCCESS(f"Refreshed {n} expectation digests"))
+            if not opts["loop"]:
+                return
+            time.sleep(opts["interval"])
@@ -1,68 +1,45 @@
-import os, email, imaplib, datetime
-from email.header import decode_header, make_header
+import signal
+import threading
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from applications.models import Notification
+from applications import mail_sync
 
 
 class Command(BaseCommand):
-    help = "Scan IMAP inbox for university notifications and store them."
+    help = (
+        "Ingest new mail from the IMAP inbox as notifications. Only messages "
+        "above each mailbox's UID checkpoint are fetched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mailbox",
+            action="append",
+            dest="mailboxes",
+            help="Mailbox to scan (repeatable). Default: INBOX, Junk, Spam.",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep running: one IMAP IDLE connection per mailbox.",
+        )
 
     def handle(self, *args, **opts):
-        host = os.getenv("APPMGR_IMAP_HOST")
-        user = os.getenv("APPMGR_IMAP_USER")
-        pwd = os.getenv("APPMGR_IMAP_PASS")
-        if not all([host, user, pwd]):
+        conf = mail_sync.settings()
+        if conf is None:
             self.stdout.write(
                 self.style.WARNING("Set APPMGR_IMAP_HOST/USER/PASS env vars.")
             )
             return
 
-        M = imaplib.IMAP4_SSL(host)
-        M.login(user, pwd)
-        for mailbox in ["INBOX", "Junk", "Spam"]:
-            try:
-                M.select(mailbox)
-            except Exception:
-                continue
-            status, data = M.search(None, "UNSEEN")
-            if status != "OK":
-                continue
-            for num in data[0].split():
-                status, msgdata = M.fetch(num, "(RFC822)")
-                if status != "OK":
-                    continue
-                msg = email.message_from_bytes(msgdata[0][1])
-                subject = str(make_header(decode_header(msg.get("Subject", ""))))
-                date_hdr = msg.get("Date")
-                try:
-                    received_at = datetime.datetime.fromtimestamp(
-                        email.utils.mktime_tz(email.utils.parsedate_tz(date_hdr)),
-                        tz=timezone.utc,
-                    )
-                except Exception:
-                    received_at = timezone.now()
-
-                # Extract a short text snippet
-                snippet = ""
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        if part.get_content_type() == "text/plain":
-                            snippet = part.get_payload(decode=True).decode(
-                                errors="ignore"
-                            )[:500]
-                            break
-                else:
-                    if msg.get_content_type() == "text/plain":
-                        snippet = msg.get_payload(decode=True).decode(errors="ignore")[
-                            :500
-                        ]
+        mailboxes = opts["mailboxes"] or mail_sync.MAILBOXES
+        if opts["watch"]:
+            stop = threading.Event()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda *_: stop.set())
+            self.stdout.write(f"Watching {', '.join(mailboxes)}")
+            mail_sync.watch(conf, mailboxes, stop)
+            return
 
-                Notification.objects.create(
-                    source=mailbox,
-                    subject=subject or "(no subject)",
-                    snippet=snippet or "",
-                    received_at=received_at,
-                )
-                self.stdout.write(self.style.SUCCESS(f"Ingested: {subject[:60]}"))
-        M.logout()
+        counts = mail_sync.sync_all(conf, mailboxes)
+        for mailbox, n in counts.items():
+            self.stdout.write(self.style.SUCCESS(f"{mailbox}: ingested {n}"))
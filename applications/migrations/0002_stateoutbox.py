@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StateOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("username", models.CharField(max_length=150)),
+                ("app_id", models.BigIntegerField()),
+                (
+                    "op",
+                    models.CharField(
+                        choices=[("upsert", "Upsert"), ("delete", "Delete")],
+                        default="upsert",
+                        max_length=8,
+                    ),
+                ),
+                ("status", models.CharField(blank=True, default="", max_length=32)),
+                ("priority", models.IntegerField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "available_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["available_at", "id"],
+                        name="application_availab_748b3f_idx",
+                    ),
+                    models.Index(
+                        fields=["username", "app_id"],
+                        name="application_usernam_43bea1_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
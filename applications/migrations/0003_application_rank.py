@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of applications.ranking.evenly_spaced as of this migration.
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def evenly_spaced(n):
+    width = 1
+    while len(DIGITS) ** width <= n:
+        width += 1
+    span = len(DIGITS) ** width
+    keys = []
+    for i in range(1, n + 1):
+        v = i * span // (n + 1)
+        digits = []
+        for _ in range(width):
+            v, r = divmod(v, len(DIGITS))
+            digits.append(DIGITS[r])
+        keys.append("".join(reversed(digits)).rstrip("0"))
+    return keys
+
+
+def backfill_ranks(apps, schema_editor):
+    Application = apps.get_model("applications", "Application")
+    user_ids = Application.objects.values_list("user_id", flat=True).distinct()
+    for user_id in user_ids:
+        rows = list(
+            Application.objects.filter(user_id=user_id)
+            .order_by("priority", "-last_updated", "id")
+            .only("id", "rank")
+        )
+        for row, key in zip(rows, evenly_spaced(len(rows))):
+            row.rank = key
+        Application.objects.bulk_update(rows, ["rank"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0002_stateoutbox"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="application",
+            name="rank",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name="application",
+            index=models.Index(
+                fields=["user", "rank"], name="application_user_id_ba2a12_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_ranks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0003_application_rank"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="S3Tombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.CharField(max_length=255)),
+                ("key", models.CharField(max_length=1024)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                (
+                    "available_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["available_at", "id"],
+                        name="application_availab_091a2f_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0004_s3tombstone"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExtractedText",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cache_key", models.CharField(max_length=64, unique=True)),
+                ("s3_key", models.CharField(max_length=1024)),
+                ("etag", models.CharField(max_length=128)),
+                ("text", models.TextField()),
+                ("size", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0005_extractedtext"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SopAnalysis",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("cache_key", models.CharField(max_length=64, unique=True)),
+                ("model", models.CharField(max_length=100)),
+                ("markdown", models.TextField()),
+                ("size", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "last_used_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+        ),
+    ]
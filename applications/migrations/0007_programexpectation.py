@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0006_sopanalysis"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProgramExpectation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("college_key", models.CharField(max_length=255)),
+                ("program_key", models.CharField(max_length=255)),
+                ("college", models.CharField(max_length=255)),
+                ("program", models.CharField(max_length=255)),
+                ("digest", models.TextField(blank=True)),
+                ("fetched_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "available_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("college_key", "program_key"),
+                        name="uniq_program_expectation",
+                    )
+                ],
+            },
+        ),
+    ]
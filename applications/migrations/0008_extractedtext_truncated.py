@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0007_programexpectation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="extractedtext",
+            name="truncated",
+            field=models.BooleanField(default=False),
+        ),
+    ]
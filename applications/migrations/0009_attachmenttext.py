@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0008_extractedtext_truncated"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="extractedtext",
+            name="page_count",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="AttachmentText",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("ready", "Ready"), ("failed", "Failed")],
+                        default="ready",
+                        max_length=8,
+                    ),
+                ),
+                ("text", models.TextField(blank=True)),
+                ("truncated", models.BooleanField(default=False)),
+                ("page_count", models.PositiveIntegerField(blank=True, null=True)),
+                ("word_count", models.PositiveIntegerField(default=0)),
+                ("token_count", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(blank=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "attachment",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="extracted",
+                        to="applications.attachment",
+                    ),
+                ),
+            ],
+        ),
+    ]
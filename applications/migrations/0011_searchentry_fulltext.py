@@ -0,0 +1,175 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:45
+
+from django.db import migrations
+
+PG_FORWARD = [
+    """
+    ALTER TABLE applications_searchentry ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(body, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX applications_searchentry_vector_idx "
+    "ON applications_searchentry USING GIN (search_vector)",
+]
+PG_REVERSE = [
+    "DROP INDEX IF EXISTS applications_searchentry_vector_idx",
+    "ALTER TABLE applications_searchentry DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE applications_searchentry_fts USING fts5(
+        title, body,
+        content='applications_searchentry', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER applications_searchentry_ai AFTER INSERT ON applications_searchentry
+    BEGIN
+        INSERT INTO applications_searchentry_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER applications_searchentry_ad AFTER DELETE ON applications_searchentry
+    BEGIN
+        INSERT INTO applications_searchentry_fts(applications_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER applications_searchentry_au AFTER UPDATE ON applications_searchentry
+    BEGIN
+        INSERT INTO applications_searchentry_fts(applications_searchentry_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO applications_searchentry_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS applications_searchentry_au",
+    "DROP TRIGGER IF EXISTS applications_searchentry_ad",
+    "DROP TRIGGER IF EXISTS applications_searchentry_ai",
+    "DROP TABLE IF EXISTS applications_searchentry_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        _run(schema_editor, PG_FORWARD)
+    elif vendor == "sqlite":
+        _run(schema_editor, SQLITE_FORWARD)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        _run(schema_editor, PG_REVERSE)
+    elif vendor == "sqlite":
+        _run(schema_editor, SQLITE_REVERSE)
+
+
+# Frozen copies of the applications.search entry builders as of this
+# migration, so later changes to that module cannot change the backfill.
+
+
+def _application_entry(app):
+    return {
+        "kind": "application",
+        "object_id": app.pk,
+        "user_id": app.user_id,
+        "application_id": app.pk,
+        "title": " — ".join(p for p in (app.college_name, app.program_name) if p)
+        or "Untitled application",
+        "body": app.notes or "",
+    }
+
+
+def _document_entry(doc):
+    return {
+        "kind": "document",
+        "object_id": doc.pk,
+        "user_id": doc.application.user_id,
+        "application_id": doc.application_id,
+        "title": doc.title,
+        "body": doc.content or "",
+    }
+
+
+def _attachment_entry(row):
+    att = row.attachment
+    return {
+        "kind": "attachment",
+        "object_id": att.pk,
+        "user_id": att.application.user_id,
+        "application_id": att.application_id,
+        "title": att.title,
+        "body": row.text or "",
+    }
+
+
+def _notification_entry(n):
+    # Unlinked notifications (user_id NULL) are only searchable by staff.
+    return {
+        "kind": "notification",
+        "object_id": n.pk,
+        "user_id": (
+            n.related_application.user_id if n.related_application_id else None
+        ),
+        "application_id": n.related_application_id,
+        "title": n.subject,
+        "body": n.snippet or "",
+    }
+
+
+def backfill(apps, schema_editor, batch_size=500):
+    SearchEntry = apps.get_model("applications", "SearchEntry")
+    Application = apps.get_model("applications", "Application")
+    Document = apps.get_model("applications", "Document")
+    AttachmentText = apps.get_model("applications", "AttachmentText")
+    Notification = apps.get_model("applications", "Notification")
+    sources = [
+        (Application.objects.all(), _application_entry),
+        (Document.objects.select_related("application"), _document_entry),
+        (
+            AttachmentText.objects.select_related("attachment__application"),
+            _attachment_entry,
+        ),
+        (
+            Notification.objects.select_related("related_application"),
+            _notification_entry,
+        ),
+    ]
+    SearchEntry.objects.all().delete()
+    for qs, build in sources:
+        batch = []
+        for obj in qs.iterator(chunk_size=batch_size):
+            entry = build(obj)
+            entry["title"] = entry["title"][:512]
+            batch.append(SearchEntry(**entry))
+            if len(batch) >= batch_size:
+                SearchEntry.objects.bulk_create(batch)
+                batch = []
+        SearchEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0010_searchentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0013_multipartupload"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailboxCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("account", models.CharField(max_length=255)),
+                ("mailbox", models.CharField(max_length=255)),
+                ("uidvalidity", models.BigIntegerField()),
+                ("last_uid", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="message_id",
+            field=models.CharField(blank=True, default="", max_length=512),
+        ),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("message_id", ""), _negated=True),
+                fields=("message_id",),
+                name="uniq_notification_message_id",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="mailboxcheckpoint",
+            constraint=models.UniqueConstraint(
+                fields=("account", "mailbox"), name="uniq_mailbox_checkpoint"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("applications", "0014_mail_sync"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stateoutbox",
+            name="dead",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="stateoutbox",
+            name="leased_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
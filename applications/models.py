@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -66,6 +67,8 @@ class Application(models.Model):
     college_name = models.CharField(max_length=255, default="", blank=True)
     program_name = models.CharField(max_length=255, default="", blank=True)
     priority = models.PositiveIntegerField(default=1)
+    # Fractional sort key (see ranking.py); the dashboard orders by this.
+    rank = models.CharField(max_length=64, default="", blank=True)
     STATUS_CHOICES = [
         ("draft", "Draft"),
         ("submitted", "Submitted"),
@@ -95,6 +98,9 @@ class Application(models.Model):
     notes = models.TextField(blank=True)
     last_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "rank"])]
+
     def __str__(self):
         return f"{self.user} -> {self.program}"
 
@@ -108,6 +114,17 @@ class Notification(models.Model):
     related_application = models.ForeignKey(
         Application, null=True, blank=True, on_delete=models.SET_NULL
     )
+    # Message-ID header of the source email; blank for other sources.
+    message_id = models.CharField(max_length=512, blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["message_id"],
+                condition=~models.Q(message_id=""),
+                name="uniq_notification_message_id",
+            )
+        ]
 
     def __str__(self):
         return f"{self.received_at:%Y-%m-%d} | {self.subject[:60]}"
@@ -125,7 +142,272 @@ class Attachment(models.Model):
     doc_type = models.CharField(max_length=10, choices=DOC_TYPES)
     title = models.CharField(max_length=255)
     file = models.FileField(upload_to="docs/")
+    # Set for content-addressed uploads; file then names the shared object.
+    stored_object = models.ForeignKey(
+        "StoredObject",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="attachments",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.doc_type}: {self.title}"
+
+
+class StateOutbox(models.Model):
+    """
+    Pending application-state writes, recorded in the same transaction as the
+    Application change and relayed to the state backend by drain_state_outbox.
+    Empty status / null priority mean "unchanged". leased_until is set while
+    a drainer relays the row; dead rows gave up after outbox.MAX_ATTEMPTS.
+    """
+
+    OPS = [
+        ("upsert", "Upsert"),
+        ("delete", "Delete"),
+    ]
+    username = models.CharField(max_length=150)
+    app_id = models.BigIntegerField()
+    op = models.CharField(max_length=8, choices=OPS, default="upsert")
+    status = models.CharField(max_length=32, blank=True, default="")
+    priority = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    leased_until = models.DateTimeField(null=True, blank=True)
+    dead = models.BooleanField(default=False)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["available_at", "id"]),
+            models.Index(fields=["username", "app_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.op} {self.username}/{self.app_id}"
+
+
+class S3Tombstone(models.Model):
+    """
+    S3 object scheduled for deletion. Rows are written in the same transaction
+    that removes the referencing row and purged in 1000-key batches by
+    purge_s3_tombstones.
+    """
+
+    bucket = models.CharField(max_length=255)
+    key = models.CharField(max_length=1024)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["available_at", "id"])]
+
+    def __str__(self):
+        return f"s3://{self.bucket}/{self.key}"
+
+
+class ExtractedText(models.Model):
+    """
+    Text extracted from an S3 object, keyed by sha256(key + ETag + budget)
+    so a re-uploaded object never serves stale text. truncated records that
+    the extraction budget cut the document short. Evicted least-recently-used
+    first once the table exceeds its byte budget (see text_cache.py).
+    """
+
+    cache_key = models.CharField(max_length=64, unique=True)
+    s3_key = models.CharField(max_length=1024)
+    etag = models.CharField(max_length=128)
+    text = models.TextField()
+    truncated = models.BooleanField(default=False)
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.s3_key} ({self.size} bytes)"
+
+
+class SopAnalysis(models.Model):
+    """
+    A completed SOP analysis, keyed by sha256 of everything that shaped it
+    (SOP text, college, program, notes, research digest, model and prompt
+    version). Entries expire after a TTL and are evicted least-recently-used
+    first once the table exceeds its byte budget (see analysis_cache.py).
+    """
+
+    cache_key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    markdown = models.TextField()
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.model} analysis ({self.size} bytes)"
+
+
+class ProgramExpectation(models.Model):
+    """
+    Web-research digest of what a (college, program) looks for in an SOP,
+    shared across users. Keyed by the normalised names (see expectations.py).
+    available_at is when it is next due for a (re)fetch: TTL after a success,
+    a backoff after a failure.
+    """
+
+    college_key = models.CharField(max_length=255)
+    program_key = models.CharField(max_length=255)
+    college = models.CharField(max_length=255)
+    program = models.CharField(max_length=255)
+    digest = models.TextField(blank=True)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+    available_at = models.DateTimeField(default=timezone.now, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["college_key", "program_key"],
+                name="uniq_program_expectation",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.college} – {self.program}"
+
+
+class AttachmentText(models.Model):
+    """
+    Text and size statistics of an attachment, extracted in the background
+    when its upload is finalized (see indexing.py) so the SOP assistant and
+    search read it instead of parsing on the request path.
+    """
+
+    STATUS_CHOICES = [
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    ]
+    attachment = models.OneToOneField(
+        Attachment, on_delete=models.CASCADE, related_name="extracted"
+    )
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default="ready")
+    text = models.TextField(blank=True)
+    truncated = models.BooleanField(default=False)
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    word_count = models.PositiveIntegerField(default=0)
+    token_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.attachment} ({self.status}, {self.word_count} words)"
+
+
+class SearchEntry(models.Model):
+    """
+    One searchable object, denormalised for full-text search (see
+    search.py). The database-specific index sits beside this table: a
+    generated tsvector column with a GIN index on Postgres, an FTS5 table
+    kept in sync by triggers on SQLite (migration 0011). user is None for
+    entries every user may see (notifications).
+    """
+
+    KINDS = [
+        ("application", "Application"),
+        ("document", "Document"),
+        ("attachment", "Attachment"),
+        ("notification", "Notification"),
+    ]
+    kind = models.CharField(max_length=16, choices=KINDS)
+    object_id = models.BigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    application = models.ForeignKey(
+        Application, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    title = models.CharField(max_length=512)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id"], name="uniq_search_entry"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} {self.title[:60]}"
+
+
+class StoredObject(models.Model):
+    """
+    An uploaded S3 object addressed by the sha256 of its content, shared by
+    every Attachment of the same user with identical bytes (see dedup.py).
+    ref_count is the number of attachments pointing at it; the row is
+    deleted, and the object tombstoned, when it drops to zero.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    sha256 = models.CharField(max_length=64)
+    key = models.CharField(max_length=1024)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "sha256"], name="uniq_stored_object"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.ref_count} refs)"
+
+
+class MultipartUpload(models.Model):
+    """
+    An S3 multipart upload that has been started but not yet completed or
+    aborted (see multipart.py). size is what the browser announced; the
+    assembled object is checked against it.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    application = models.ForeignKey(Application, on_delete=models.CASCADE)
+    doc_type = models.CharField(max_length=10)
+    key = models.CharField(max_length=1024)
+    upload_id = models.CharField(max_length=512, db_index=True)
+    size = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.key} ({self.upload_id[:12]}…)"
+
+
+class MailboxCheckpoint(models.Model):
+    """
+    How far scan_email has read one IMAP mailbox: every message with a UID
+    up to last_uid has been ingested. UIDs are only meaningful for one
+    UIDVALIDITY, so a change there restarts the mailbox (see mail_sync.py).
+    """
+
+    account = models.CharField(max_length=255)
+    mailbox = models.CharField(max_length=255)
+    uidvalidity = models.BigIntegerField()
+    last_uid = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "mailbox"], name="uniq_mailbox_checkpoint"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.account}/{self.mailbox} @ {self.uidvalidity}:{self.last_uid}"
@@ -0,0 +1,222 @@
+# applications/multipart.py
+"""
+S3 multipart uploads for large attachments.
+
+The browser asks for an upload (create), gets presigned PUT URLs for a batch
+of part numbers (sign_parts), uploads the parts in parallel straight to S3,
+and hands the part ETags back (complete). A failed part is simply signed and
+sent again, and list_parts() lets a reloaded page resume where it stopped.
+Every open upload has a MultipartUpload row so only its owner can sign or
+complete it; sweep() aborts uploads that were never finished, since S3
+keeps billing for their parts until then.
+"""
+
+import datetime
+import logging
+import math
+import os
+from typing import Dict, Iterable, List
+
+from botocore.exceptions import ClientError
+from django.utils import timezone
+
+from . import aws
+from .models import MultipartUpload
+
+log = logging.getLogger(__name__)
+
+PART_SIZE = int(os.getenv("APPMGR_UPLOAD_PART_MB", "8")) * 1024 * 1024
+MAX_BYTES = int(os.getenv("APPMGR_MULTIPART_MAX_MB", "500")) * 1024 * 1024
+MAX_PARTS = 10000  # S3 limit
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 limit for every part but the last
+MAX_SIGN_BATCH = 100
+URL_EXPIRES = 3600
+
+
+class UploadError(ValueError):
+    """The request does not describe an acceptable multipart upload."""
+
+
+def _bucket() -> str:
+    return os.getenv("AWS_STORAGE_BUCKET_NAME") or ""
+
+
+def _s3_error(e: ClientError) -> str:
+    err = e.response.get("Error", {})
+    return err.get("Message") or err.get("Code") or "S3 error"
+
+
+def _gone(row: MultipartUpload, e: ClientError) -> UploadError:
+    """UploadError for e; forgets row if S3 no longer knows the upload."""
+    if e.response.get("Error", {}).get("Code") == "NoSuchUpload":
+        row.delete()
+        return UploadError("upload expired or was aborted; start it again")
+    return UploadError(_s3_error(e))
+
+
+def part_size_for(size: int) -> int:
+    return max(PART_SIZE, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+
+
+def create(user, application, doc_type: str, key: str, size: int, content_type: str):
+    """Start an upload of size bytes to key. Returns (row, part_size, parts)."""
+    if size <= 0 or size > MAX_BYTES:
+        raise UploadError(f"size must be between 1 and {MAX_BYTES} bytes")
+    resp = aws.client("s3").create_multipart_upload(
+        Bucket=_bucket(), Key=key, ACL="private", ContentType=content_type
+    )
+    row = MultipartUpload.objects.create(
+        user=user,
+        application=application,
+        doc_type=doc_type,
+        key=key,
+        upload_id=resp["UploadId"],
+        size=size,
+    )
+    part_size = part_size_for(size)
+    return row, part_size, math.ceil(size / part_size)
+
+
+def get(user, upload_id: str) -> MultipartUpload:
+    row = MultipartUpload.objects.filter(user=user, upload_id=upload_id).first()
+    if row is None:
+        raise UploadError("unknown upload")
+    return row
+
+
+def part_count(row: MultipartUpload) -> int:
+    return math.ceil(row.size / part_size_for(row.size))
+
+
+def sign_parts(row: MultipartUpload, part_numbers: Iterable[int]) -> Dict[int, str]:
+    numbers = sorted({int(n) for n in part_numbers})
+    if not numbers or len(numbers) > MAX_SIGN_BATCH:
+        raise UploadError(f"sign between 1 and {MAX_SIGN_BATCH} parts at a time")
+    count = part_count(row)
+    if numbers[0] < 1 or numbers[-1] > count:
+        raise UploadError(f"part numbers must be between 1 and {count}")
+    s3 = aws.client("s3")
+    return {
+        n: s3.generate_presigned_url(
+            "upload_part",
+            Params={
+                "Bucket": _bucket(),
+                "Key": row.key,
+                "UploadId": row.upload_id,
+                "PartNumber": n,
+            },
+            ExpiresIn=URL_EXPIRES,
+        )
+        for n in numbers
+    }
+
+
+def list_parts(row: MultipartUpload) -> List[dict]:
+    paginator = aws.client("s3").get_paginator("list_parts")
+    parts = []
+    try:
+        for page in paginator.paginate(
+            Bucket=_bucket(), Key=row.key, UploadId=row.upload_id
+        ):
+            for p in page.get("Parts", []):
+                parts.append(
+                    {
+                        "PartNumber": p["PartNumber"],
+                        "ETag": p["ETag"],
+                        "Size": p["Size"],
+                    }
+                )
+    except ClientError as e:
+        raise _gone(row, e) from None
+    return parts
+
+
+def parse_parts(parts) -> List[dict]:
+    """Validated, sorted [{"PartNumber", "ETag"}] from a client payload."""
+    try:
+        out = sorted(
+            (
+                {"PartNumber": int(p["PartNumber"]), "ETag": str(p["ETag"])}
+                for p in parts
+            ),
+            key=lambda p: p["PartNumber"],
+        )
+    except (KeyError, TypeError, ValueError):
+        raise UploadError("parts must be a list of {PartNumber, ETag}") from None
+    if not out:
+        raise UploadError("no parts")
+    if out[0]["PartNumber"] < 1 or out[-1]["PartNumber"] > MAX_PARTS:
+        raise UploadError(f"part numbers must be between 1 and {MAX_PARTS}")
+    return out
+
+
+def complete(row: MultipartUpload, parts: List[dict]) -> None:
+    """
+    Assemble the object from parts (as returned by parse_parts). Part URLs
+    cannot cap their body size, so the result is checked here and deleted
+    if it is larger than announced.
+    """
+    s3 = aws.client("s3")
+    bucket = _bucket()
+    try:
+        s3.complete_multipart_upload(
+            Bucket=bucket,
+            Key=row.key,
+            UploadId=row.upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except ClientError as e:
+        # InvalidPart etc.: the row stays, so the client can resend and retry.
+        raise _gone(row, e) from None
+    row.delete()
+    try:
+        size = s3.head_object(Bucket=bucket, Key=row.key)["ContentLength"]
+    except ClientError as e:
+        raise UploadError(_s3_error(e)) from None
+    if size > min(row.size, MAX_BYTES):
+        s3.delete_object(Bucket=bucket, Key=row.key)
+        raise UploadError("uploaded object is larger than announced")
+
+
+def abort(row: MultipartUpload) -> None:
+    s3 = aws.client("s3")
+    try:
+        s3.abort_multipart_upload(Bucket=_bucket(), Key=row.key, UploadId=row.upload_id)
+    except s3.exceptions.NoSuchUpload:
+        pass
+    row.delete()
+
+
+def sweep(max_age: datetime.timedelta = datetime.timedelta(days=1)) -> int:
+    """
+    Abort uploads started more than max_age ago, including ones S3 knows
+    about but no row does (e.g. after a crash between create and insert).
+    Only the app's prefixes are listed (see s3_gc.app_prefixes); uploads
+    other tools started elsewhere in the bucket are left alone. Returns the
+    number of uploads aborted.
+    """
+    from .s3_gc import app_prefixes
+
+    bucket = _bucket()
+    if not bucket:
+        return 0
+    cutoff = timezone.now() - max_age
+    s3 = aws.client("s3")
+    n = 0
+    paginator = s3.get_paginator("list_multipart_uploads")
+    for prefix in app_prefixes():
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for up in page.get("Uploads", []):
+                if up["Initiated"] >= cutoff:
+                    continue
+                try:
+                    s3.abort_multipart_upload(
+                        Bucket=bucket, Key=up["Key"], UploadId=up["UploadId"]
+                    )
+                    n += 1
+                except s3.exceptions.NoSuchUpload:
+                    pass
+                except Exception as e:
+                    log.warning("abort of %s failed: %s", up["Key"], e)
+    MultipartUpload.objects.filter(created_at__lt=cutoff).delete()
+    return n
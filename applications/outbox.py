@@ -0,0 +1,226 @@
+# applications/outbox.py
+"""
+Transactional outbox for application-state writes.
+
+Views record state changes as StateOutbox rows inside the same DB
+transaction as the Application update (see state.py), so a request never
+waits on DynamoDB. The drain_state_outbox command relays them in coalesced
+batches: for each (username, app_id) only the net effect of all pending rows
+is written, and a user's priority-only changes go out as one
+update_priorities call.
+
+A drain claims its rows in a short transaction (a lease on every pending
+row of each key it takes) and calls the backend after committing, so no
+row lock or connection is held across network retries. A key with a
+leased row, or one in retry backoff, is left to whoever holds it, which
+keeps each key's writes in order. Rows that fail MAX_ATTEMPTS times are
+marked dead and stop blocking the queue; `drain_state_outbox --retry-dead`
+puts them back.
+"""
+
+import datetime
+import logging
+from collections import Counter
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import fragments
+from .models import StateOutbox
+
+User = get_user_model()
+
+log = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 300
+MAX_ATTEMPTS = 12
+# Longer than any backend call with its retries, so a lease only expires
+# when the drainer holding it died.
+LEASE_SECONDS = 600
+
+Key = Tuple[str, int]
+
+
+def enqueue_upsert(
+    username: str,
+    app_id: int,
+    *,
+    status: Optional[str] = None,
+    priority: Optional[int] = None,
+) -> None:
+    StateOutbox.objects.create(
+        username=username,
+        app_id=app_id,
+        op="upsert",
+        status=status or "",
+        priority=None if priority is None else int(priority),
+    )
+
+
+def enqueue_priorities(username: str, priorities: Mapping[int, int]) -> None:
+    StateOutbox.objects.bulk_create(
+        [
+            StateOutbox(username=username, app_id=aid, op="upsert", priority=int(p))
+            for aid, p in priorities.items()
+        ]
+    )
+
+
+def enqueue_delete(username: str, app_id: int) -> None:
+    StateOutbox.objects.create(username=username, app_id=app_id, op="delete")
+
+
+def _backoff(attempts: int) -> datetime.timedelta:
+    return datetime.timedelta(seconds=min(2**attempts, MAX_BACKOFF_SECONDS))
+
+
+def _coalesce(rows: List[StateOutbox]) -> Dict[str, object]:
+    """Fold rows (oldest first) for one key into its net effect."""
+    net: Dict[str, object] = {"op": "upsert", "status": "", "priority": None}
+    for r in rows:
+        if r.op == "delete":
+            net = {"op": "delete", "status": "", "priority": None}
+            continue
+        net["op"] = "upsert"
+        if r.status:
+            net["status"] = r.status
+        if r.priority is not None:
+            net["priority"] = r.priority
+    return net
+
+
+def _fail(rows: List[StateOutbox], exc: Exception) -> None:
+    now = timezone.now()
+    for r in rows:
+        attempts = r.attempts + 1
+        dead = attempts >= MAX_ATTEMPTS
+        if dead:
+            log.error("outbox row %s dead after %d attempts: %s", r, attempts, exc)
+        StateOutbox.objects.filter(pk=r.pk).update(
+            attempts=attempts,
+            available_at=now + _backoff(attempts),
+            leased_until=None,
+            dead=dead,
+            last_error=str(exc)[:2000],
+        )
+
+
+def pending_app_ids(username: str) -> Set[int]:
+    """Apps of username with writes the backend has not seen yet."""
+    return set(
+        StateOutbox.objects.filter(username=username).values_list("app_id", flat=True)
+    )
+
+
+def _claim(batch_size: int, now) -> Dict[Key, List[StateOutbox]]:
+    """
+    Lease every live row of the keys found in the oldest batch_size
+    available rows. Returns the leased rows per key, oldest first.
+    """
+    live = StateOutbox.objects.filter(dead=False)
+    with transaction.atomic():
+        head = list(
+            live.select_for_update(skip_locked=True)
+            .filter(available_at__lte=now)
+            .filter(Q(leased_until__isnull=True) | Q(leased_until__lte=now))
+            .order_by("id")[:batch_size]
+        )
+        if not head:
+            return {}
+        keys = {(r.username, r.app_id) for r in head}
+        candidates = live.filter(
+            username__in={k[0] for k in keys}, app_id__in={k[1] for k in keys}
+        )
+        grouped: Dict[Key, List[StateOutbox]] = {}
+        for r in candidates.select_for_update(skip_locked=True).order_by("id"):
+            if (r.username, r.app_id) in keys:
+                grouped.setdefault((r.username, r.app_id), []).append(r)
+        # Rows skip_locked hid are being claimed by another drainer.
+        total = Counter(candidates.values_list("username", "app_id"))
+
+        claimed: Dict[Key, List[StateOutbox]] = {}
+        for key, rows in grouped.items():
+            if len(rows) < total[key]:
+                continue
+            if any(r.leased_until and r.leased_until > now for r in rows):
+                continue
+            retry_at = max(r.available_at for r in rows)
+            if retry_at > now:
+                # The key is in backoff. Park its newer rows behind it so a
+                # failing key cannot fill the head and starve everyone else.
+                StateOutbox.objects.filter(
+                    pk__in=[r.pk for r in rows if r.available_at < retry_at]
+                ).update(available_at=retry_at)
+                continue
+            claimed[key] = rows
+        StateOutbox.objects.filter(
+            pk__in=[r.pk for rows in claimed.values() for r in rows]
+        ).update(leased_until=now + datetime.timedelta(seconds=LEASE_SECONDS))
+    return claimed
+
+
+def drain(batch_size: int = 500, backend=None) -> int:
+    """
+    Relay the keys found in up to batch_size pending rows. Returns the
+    number of rows settled.
+    """
+    from . import state
+
+    backend = backend or state.get_backend()
+    grouped = _claim(batch_size, timezone.now())
+    if not grouped:
+        return 0
+
+    done: List[int] = []
+    pri_batches: Dict[str, Dict[int, int]] = {}
+    pri_rows: Dict[str, List[StateOutbox]] = {}
+    for (username, app_id), rows in grouped.items():
+        net = _coalesce(rows)
+        if net["op"] == "upsert" and not net["status"]:
+            if net["priority"] is not None:
+                pri_batches.setdefault(username, {})[app_id] = net["priority"]
+                pri_rows.setdefault(username, []).extend(rows)
+            else:
+                done.extend(r.pk for r in rows)
+            continue
+        try:
+            if net["op"] == "delete":
+                backend.delete_state(username, app_id)
+            elif net["priority"] is not None:
+                backend.put_state(username, app_id, net["status"], net["priority"])
+            else:
+                backend.update_status(username, app_id, net["status"])
+        except Exception as e:
+            log.warning("outbox write %s/%s failed: %s", username, app_id, e)
+            _fail(rows, e)
+            continue
+        done.extend(r.pk for r in rows)
+
+    for username, priorities in pri_batches.items():
+        try:
+            backend.update_priorities(username, priorities)
+        except Exception as e:
+            log.warning("outbox reorder for %s failed: %s", username, e)
+            _fail(pri_rows[username], e)
+            continue
+        done.extend(r.pk for r in pri_rows[username])
+
+    StateOutbox.objects.filter(pk__in=done).delete()
+    # Dashboards overlay backend state, so their cached fragments are stale now.
+    settled = set(done)
+    relayed = {r.username for rows in grouped.values() for r in rows if r.pk in settled}
+    for user_id in User.objects.filter(username__in=relayed).values_list(
+        "id", flat=True
+    ):
+        fragments.bump_user(user_id)
+    return len(done)
+
+
+def retry_dead() -> int:
+    """Put dead rows back in the queue. Returns how many."""
+    return StateOutbox.objects.filter(dead=True).update(
+        dead=False, attempts=0, available_at=timezone.now(), leased_until=None
+    )
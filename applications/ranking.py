@@ -0,0 +1,160 @@
+# applications/ranking.py
+"""
+Fractional (lexicographic) rank keys for ordering applications.
+
+Keys are base-36 strings over 0-9a-z, which sort identically under SQLite's
+BINARY collation and Postgres' locale collations. A new key can always be
+generated strictly between two neighbours, so moving one row rewrites only
+that row. Keys never end in "0", which guarantees there is room below every
+key. When keys grow past MAX_KEY_LENGTH, rebalance_user() respaces them.
+
+Every function that picks keys first locks the owner's User row, so two
+requests of one user (a double submit, two tabs) cannot hand out the same
+key.
+"""
+
+from typing import List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+MAX_KEY_LENGTH = 12
+
+
+def key_between(lower: str = "", upper: str = "") -> str:
+    """
+    Return a key k with lower < k < upper. An empty lower/upper means
+    unbounded on that side.
+    """
+    if upper and lower >= upper:
+        raise ValueError(f"no key between {lower!r} and {upper!r}")
+    out = []
+    i = 0
+    while True:
+        lo = DIGITS.index(lower[i]) if i < len(lower) else 0
+        hi = DIGITS.index(upper[i]) if i < len(upper) else BASE
+        if lo == hi:
+            out.append(DIGITS[lo])
+            i += 1
+            continue
+        mid = (lo + hi) // 2
+        if mid > lo:
+            out.append(DIGITS[mid])
+            return "".join(out)
+        # Adjacent digits: keep lower's digit and search above the rest of it.
+        out.append(DIGITS[lo])
+        upper = ""
+        i += 1
+
+
+def evenly_spaced(n: int) -> List[str]:
+    """n ascending keys, evenly spread and as short as possible."""
+    width = 1
+    while BASE**width <= n:
+        width += 1
+    span = BASE**width
+    keys = []
+    for i in range(1, n + 1):
+        v = i * span // (n + 1)
+        digits = []
+        for _ in range(width):
+            v, r = divmod(v, BASE)
+            digits.append(DIGITS[r])
+        keys.append("".join(reversed(digits)).rstrip("0"))
+    return keys
+
+
+def _lock_user(user) -> None:
+    from django.contrib.auth import get_user_model
+
+    get_user_model().objects.select_for_update().filter(pk=user.pk).exists()
+
+
+def rebalance_user(user) -> int:
+    """
+    Respace every rank key of one user in the current order and renumber the
+    stored priorities to match. Returns the number of applications touched.
+    """
+    from . import fragments, state
+    from .models import Application
+
+    with transaction.atomic():
+        _lock_user(user)
+        apps = list(
+            Application.objects.select_for_update()
+            .filter(user=user)
+            .order_by("rank", "-last_updated", "id")
+            .only("id", "rank", "priority")
+        )
+        for idx, (a, key) in enumerate(zip(apps, evenly_spaced(len(apps))), start=1):
+            a.rank = key
+            a.priority = idx
+        Application.objects.bulk_update(apps, ["rank", "priority"], batch_size=500)
+        state.update_priorities(user.username, {a.id: a.priority for a in apps})
+        fragments.bump_user(user.id)
+    return len(apps)
+
+
+def next_rank(user) -> str:
+    """
+    Key that sorts after every existing application of this user. Call
+    inside the transaction that saves the application: the user stays
+    locked until it commits.
+    """
+    from .models import Application
+
+    _lock_user(user)
+    last = (
+        Application.objects.filter(user=user)
+        .order_by("-rank")
+        .values_list("rank", flat=True)
+        .first()
+    )
+    return key_between(last or "", "")
+
+
+def position(app) -> int:
+    """1-based position of app on its owner's dashboard."""
+    from .models import Application
+
+    return (
+        Application.objects.filter(user_id=app.user_id, rank__lt=app.rank).count() + 1
+    )
+
+
+def move_after(user, app_id: int, after_id: Optional[int] = None) -> int:
+    """
+    Place app_id directly below after_id (at the top when None). Only the
+    moved row is written. Returns its new 1-based position.
+    """
+    from . import fragments, state
+    from .models import Application
+
+    with transaction.atomic():
+        _lock_user(user)
+        others = (
+            Application.objects.select_for_update()
+            .filter(user=user)
+            .exclude(id=app_id)
+            .order_by("rank", "-last_updated", "id")
+        )
+        lower = ""
+        if after_id is not None:
+            lower = others.filter(id=after_id).values_list("rank", flat=True).get()
+        upper = (
+            others.filter(rank__gt=lower).values_list("rank", flat=True).first() or ""
+        )
+        key = key_between(lower, upper)
+        pos = others.filter(rank__lt=key).count() + 1
+        updated = Application.objects.filter(id=app_id, user=user).update(
+            rank=key, priority=pos, last_updated=timezone.now()
+        )
+        if not updated:
+            raise Application.DoesNotExist
+        state.update_priority(user.username, app_id, pos)
+        fragments.bump_user(user.id)
+    if len(key) > MAX_KEY_LENGTH:
+        rebalance_user(user)
+    return pos
@@ -0,0 +1,167 @@
+# applications/s3_gc.py
+"""
+Deferred S3 deletion.
+
+Deleting an Attachment (directly or through the Application cascade) only
+records an S3Tombstone; purge() later removes the objects with batched
+delete_objects calls, and reconcile() re-enqueues objects under the app's
+prefixes that no row points at any more. An object shared by several
+attachments (see dedup.py) is only tombstoned when its last reference is
+deleted. The `gc` process in fly.toml runs `purge_s3_tombstones --loop`.
+"""
+
+import datetime
+import logging
+import os
+from typing import Iterable, Iterator, List, Set
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import aws
+from .models import Attachment, Document, S3Tombstone, StoredObject
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000  # delete_objects limit
+MAX_BACKOFF_SECONDS = 3600
+# purge() owns claimed rows this long; S3 calls are well inside it.
+LEASE = datetime.timedelta(minutes=10)
+
+
+def _bucket() -> str:
+    return os.getenv("AWS_STORAGE_BUCKET_NAME") or ""
+
+
+def enqueue_keys(keys: Iterable[str]) -> int:
+    bucket = _bucket()
+    rows = [S3Tombstone(bucket=bucket, key=k) for k in keys if k]
+    if not bucket or not rows:
+        return 0
+    S3Tombstone.objects.bulk_create(rows)
+    return len(rows)
+
+
+def _claim(batch_size: int, now) -> List[S3Tombstone]:
+    """
+    Lease up to batch_size available rows by moving available_at past the
+    S3 call, so the row locks are released before any network round trip.
+    A purger that dies mid-batch leaves rows that come back after LEASE.
+    """
+    with transaction.atomic():
+        rows = list(
+            S3Tombstone.objects.select_for_update(skip_locked=True)
+            .filter(available_at__lte=now)
+            .order_by("id")[:batch_size]
+        )
+        S3Tombstone.objects.filter(pk__in=[r.pk for r in rows]).update(
+            available_at=now + LEASE
+        )
+    return rows
+
+
+def purge(batch_size: int = BATCH_SIZE) -> int:
+    """Delete up to batch_size tombstoned objects. Returns objects removed."""
+    s3 = aws.client("s3")
+    now = timezone.now()
+    rows = _claim(batch_size, now)
+    by_bucket = {}
+    for r in rows:
+        by_bucket.setdefault(r.bucket, []).append(r)
+
+    done: List[int] = []
+    retry = []
+    for bucket, group in by_bucket.items():
+        keys = sorted({r.key for r in group})
+        try:
+            resp = s3.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": k} for k in keys], "Quiet": True},
+            )
+            failed = {
+                e.get("Key"): e.get("Message", "") for e in resp.get("Errors", [])
+            }
+        except Exception as e:
+            log.warning("delete_objects on %s failed: %s", bucket, e)
+            failed = {k: str(e) for k in keys}
+        for r in group:
+            if r.key in failed:
+                retry.append((r, failed[r.key]))
+            else:
+                done.append(r.pk)
+
+    with transaction.atomic():
+        for r, error in retry:
+            S3Tombstone.objects.filter(pk=r.pk).update(
+                attempts=r.attempts + 1,
+                available_at=now
+                + datetime.timedelta(
+                    seconds=min(2 ** (r.attempts + 1), MAX_BACKOFF_SECONDS)
+                ),
+                last_error=error[:2000],
+            )
+        S3Tombstone.objects.filter(pk__in=done).delete()
+    return len(done)
+
+
+def app_prefixes() -> Iterator[str]:
+    """Key prefixes this app writes under: docs/ and one per user."""
+    from django.contrib.auth import get_user_model
+
+    from .dedup import user_prefix
+
+    seen = {"docs/"}
+    yield "docs/"
+    for user in get_user_model().objects.only("username").iterator():
+        prefix = f"{user_prefix(user)}/"
+        if prefix not in seen:
+            seen.add(prefix)
+            yield prefix
+
+
+def _referenced(prefix: str) -> Set[str]:
+    keys = set(
+        Attachment.objects.filter(file__startswith=prefix).values_list(
+            "file", flat=True
+        )
+    )
+    keys |= set(
+        Document.objects.filter(file__startswith=prefix).values_list("file", flat=True)
+    )
+    keys |= set(
+        StoredObject.objects.filter(key__startswith=prefix).values_list(
+            "key", flat=True
+        )
+    )
+    keys |= set(
+        S3Tombstone.objects.filter(key__startswith=prefix).values_list("key", flat=True)
+    )
+    return keys
+
+
+def reconcile(grace: datetime.timedelta = datetime.timedelta(days=1)) -> int:
+    """
+    Enqueue objects older than grace that no Attachment, Document or
+    StoredObject references. The grace period covers uploads between presign
+    and finalize. Only the app's own prefixes are listed, one at a time, so
+    other data in the bucket is never touched and memory holds the keys of
+    a single user.
+    """
+    bucket = _bucket()
+    if not bucket:
+        return 0
+    cutoff = timezone.now() - grace
+    paginator = aws.client("s3").get_paginator("list_objects_v2")
+    n = 0
+    for prefix in app_prefixes():
+        referenced = None
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            contents = page.get("Contents", [])
+            if contents and referenced is None:
+                referenced = _referenced(prefix)
+            n += enqueue_keys(
+                obj["Key"]
+                for obj in contents
+                if obj["Key"] not in referenced and obj["LastModified"] < cutoff
+            )
+    return n
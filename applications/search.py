@@ -0,0 +1,273 @@
+# applications/search.py
+"""
+Full-text search over applications, documents, attachment text and
+notifications.
+
+Each searchable object is mirrored into one SearchEntry row by the signal
+handlers in signals.py. The database does the matching and ranking:
+Postgres through a generated tsvector column with a GIN index, and SQLite
+through an FTS5 table kept in sync by triggers (both created in migration
+0011). Other backends fall back to icontains. Queries are treated as
+prefix matches on every word, so results update while the user types.
+"""
+
+import functools
+import re
+from typing import List, NamedTuple, Optional
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+MAX_TERMS = 8
+SNIPPET_WORDS = 16
+# Highlight markers chosen to survive both engines' option parsing and to
+# be swapped for <mark> only after the snippet has been HTML-escaped.
+HL_START = "[[hl]]"
+HL_STOP = "[[/hl]]"
+FTS_TABLE = "applications_searchentry_fts"
+
+
+class Hit(NamedTuple):
+    kind: str
+    object_id: int
+    application_id: Optional[int]
+    title: str
+    snippet: str
+
+
+# --- index maintenance -------------------------------------------------------
+# Migration 0011 carries its own frozen copy of these builders; change them
+# freely, then run `rebuild_search_index` (or rebuild()) to re-index.
+
+
+def application_entry(app) -> dict:
+    return {
+        "kind": "application",
+        "object_id": app.pk,
+        "user_id": app.user_id,
+        "application_id": app.pk,
+        "title": " — ".join(p for p in (app.college_name, app.program_name) if p)
+        or "Untitled application",
+        "body": app.notes or "",
+    }
+
+
+def document_entry(doc) -> dict:
+    return {
+        "kind": "document",
+        "object_id": doc.pk,
+        "user_id": doc.application.user_id,
+        "application_id": doc.application_id,
+        "title": doc.title,
+        "body": doc.content or "",
+    }
+
+
+def attachment_entry(row) -> dict:
+    att = row.attachment
+    return {
+        "kind": "attachment",
+        "object_id": att.pk,
+        "user_id": att.application.user_id,
+        "application_id": att.application_id,
+        "title": att.title,
+        "body": row.text or "",
+    }
+
+
+def notification_entry(n) -> dict:
+    # Unlinked notifications (user_id NULL) are only searchable by staff.
+    return {
+        "kind": "notification",
+        "object_id": n.pk,
+        "user_id": (
+            n.related_application.user_id if n.related_application_id else None
+        ),
+        "application_id": n.related_application_id,
+        "title": n.subject,
+        "body": n.snippet or "",
+    }
+
+
+def upsert(entry: dict) -> None:
+    from .models import SearchEntry
+
+    entry = dict(entry)
+    entry["title"] = entry["title"][:512]
+    SearchEntry.objects.update_or_create(
+        kind=entry.pop("kind"), object_id=entry.pop("object_id"), defaults=entry
+    )
+
+
+def add_many(entries) -> None:
+    """Insert entries for objects that have none yet, e.g. after bulk_create
+    (which sends no post_save, so signals.py never sees those rows)."""
+    from .models import SearchEntry
+
+    rows = []
+    for entry in entries:
+        entry = dict(entry)
+        entry["title"] = entry["title"][:512]
+        rows.append(SearchEntry(**entry))
+    SearchEntry.objects.bulk_create(rows)
+
+
+def remove(kind: str, object_id: int) -> None:
+    from .models import SearchEntry
+
+    SearchEntry.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def rebuild(
+    SearchEntry=None,
+    Application=None,
+    Document=None,
+    AttachmentText=None,
+    Notification=None,
+    batch_size: int = 500,
+) -> int:
+    """Rebuild every entry. Returns the number of entries written."""
+    from . import models
+
+    SearchEntry = SearchEntry or models.SearchEntry
+    sources = [
+        ((Application or models.Application).objects.all(), application_entry),
+        (
+            (Document or models.Document).objects.select_related("application"),
+            document_entry,
+        ),
+        (
+            (AttachmentText or models.AttachmentText).objects.select_related(
+                "attachment__application"
+            ),
+            attachment_entry,
+        ),
+        (
+            (Notification or models.Notification).objects.select_related(
+                "related_application"
+            ),
+            notification_entry,
+        ),
+    ]
+    SearchEntry.objects.all().delete()
+    n = 0
+    for qs, build in sources:
+        batch = []
+        for obj in qs.iterator(chunk_size=batch_size):
+            entry = build(obj)
+            entry["title"] = entry["title"][:512]
+            batch.append(SearchEntry(**entry))
+            if len(batch) >= batch_size:
+                SearchEntry.objects.bulk_create(batch)
+                n += len(batch)
+                batch = []
+        SearchEntry.objects.bulk_create(batch)
+        n += len(batch)
+    return n
+
+
+# --- querying ----------------------------------------------------------------
+
+
+def _terms(q: str) -> List[str]:
+    return re.findall(r"\w+", (q or "").lower())[:MAX_TERMS]
+
+
+def _render(snippet: str) -> str:
+    html = escape(snippet).replace(HL_START, "<mark>").replace(HL_STOP, "</mark>")
+    return mark_safe(html)
+
+
+@functools.lru_cache(maxsize=None)
+def _has_fts(alias: str) -> bool:
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def _search_postgres(user, terms: List[str], limit: int) -> list:
+    tsquery = " & ".join(f"{t}:*" for t in terms)
+    options = (
+        f'StartSel="{HL_START}", StopSel="{HL_STOP}", MaxWords={SNIPPET_WORDS}, '
+        'MinWords=6, MaxFragments=2, FragmentDelimiter=" … "'
+    )
+    sql = """
+        SELECT kind, object_id, application_id, title,
+               ts_headline('english', body, query, %s)
+        FROM (
+            SELECT e.kind, e.object_id, e.application_id, e.title, e.body,
+                   q.query, ts_rank(e.search_vector, q.query) AS rank
+            FROM applications_searchentry e,
+                 to_tsquery('english', %s) AS q(query)
+            WHERE e.search_vector @@ q.query
+              AND (e.user_id = %s OR (%s AND e.user_id IS NULL))
+            ORDER BY rank DESC, e.updated_at DESC
+            LIMIT %s
+        ) hits
+        ORDER BY rank DESC
+    """
+    with connection.cursor() as cur:
+        cur.execute(sql, [options, tsquery, user.pk, user.is_staff, limit])
+        return cur.fetchall()
+
+
+def _search_sqlite(user, terms: List[str], limit: int) -> list:
+    match = " ".join(f'"{t}"*' for t in terms)
+    sql = f"""
+        SELECT e.kind, e.object_id, e.application_id, e.title,
+               snippet({FTS_TABLE}, 1, %s, %s, '…', %s)
+        FROM {FTS_TABLE}
+        JOIN applications_searchentry e ON e.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s
+          AND (e.user_id = %s OR (%s AND e.user_id IS NULL))
+        ORDER BY bm25({FTS_TABLE}, 4.0, 1.0)
+        LIMIT %s
+    """
+    params = [HL_START, HL_STOP, SNIPPET_WORDS, match, user.pk, user.is_staff, limit]
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def _highlight(body: str, terms: List[str]) -> str:
+    pattern = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+    m = pattern.search(body)
+    start = max((m.start() if m else 0) - 60, 0)
+    window = body[start : start + 200]
+    marked = pattern.sub(lambda x: f"{HL_START}{x.group(0)}{HL_STOP}", window)
+    return ("…" if start else "") + marked
+
+
+def _search_fallback(user, terms: List[str], limit: int) -> list:
+    from .models import SearchEntry
+
+    visible = Q(user=user)
+    if user.is_staff:
+        visible |= Q(user__isnull=True)
+    qs = SearchEntry.objects.filter(visible)
+    for t in terms:
+        qs = qs.filter(Q(title__icontains=t) | Q(body__icontains=t))
+    return [
+        (e.kind, e.object_id, e.application_id, e.title, _highlight(e.body, terms))
+        for e in qs.order_by("-updated_at")[:limit]
+    ]
+
+
+def search(user, q: str, limit: int = 20) -> List[Hit]:
+    """
+    Best matches for q among entries visible to user, best first. Entries
+    without an owner (unlinked notifications) are visible to staff only.
+    """
+    terms = _terms(q)
+    if not terms:
+        return []
+    if connection.vendor == "postgresql":
+        rows = _search_postgres(user, terms, limit)
+    elif connection.vendor == "sqlite" and _has_fts(connection.alias):
+        rows = _search_sqlite(user, terms, limit)
+    else:
+        rows = _search_fallback(user, terms, limit)
+    return [
+        Hit(kind, object_id, app_id, title, _render(snippet or ""))
+        for kind, object_id, app_id, title, snippet in rows
+    ]
@@ -0,0 +1,110 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import dedup, expectations, fragments, s3_gc, search
+from .models import (
+    Application,
+    Attachment,
+    AttachmentText,
+    Document,
+    Notification,
+    StoredObject,
+)
+
+log = logging.getLogger(__name__)
+
+
+@receiver(post_delete, sender=Attachment)
+def tombstone_attachment_object(sender, instance, **kwargs):
+    # Runs inside the deleting transaction, so the tombstone commits with it.
+    # Shared objects are only released; the last reference tombstones them.
+    if instance.stored_object_id:
+        dedup.release(instance.stored_object_id)
+    elif instance.file and instance.file.name:
+        # Never tombstone a key outside the owner's prefix, whatever a
+        # client managed to store in Attachment.file.
+        owner = (
+            get_user_model()
+            .objects.filter(application__pk=instance.application_id)
+            .first()
+        )
+        if owner is not None and dedup.owns_key(owner, instance.file.name):
+            s3_gc.enqueue_keys([instance.file.name])
+        else:
+            log.warning(
+                "attachment %s: not deleting foreign key %r",
+                instance.pk,
+                instance.file.name,
+            )
+
+
+@receiver(post_delete, sender=StoredObject)
+def tombstone_stored_object(sender, instance, **kwargs):
+    s3_gc.enqueue_keys([instance.key])
+
+
+@receiver(post_save, sender=Application)
+@receiver(post_delete, sender=Application)
+def bump_dashboard_stamp(sender, instance, **kwargs):
+    fragments.bump_user(instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_notifications_stamp(sender, instance, **kwargs):
+    fragments.bump_notifications()
+
+
+@receiver(post_save, sender=Application)
+def schedule_expectation_research(sender, instance, created, update_fields, **kwargs):
+    # Full saves may change college/program; refresh() is a no-op if current.
+    if created or update_fields is None:
+        expectations.schedule(instance.college_name, instance.program_name)
+
+
+# Search index. Saves that only touch status/rank/priority skip the rewrite.
+SEARCHED_APPLICATION_FIELDS = {"college_name", "program_name", "notes"}
+
+
+@receiver(post_save, sender=Application)
+def index_application(sender, instance, update_fields, **kwargs):
+    if update_fields is None or SEARCHED_APPLICATION_FIELDS & set(update_fields):
+        search.upsert(search.application_entry(instance))
+
+
+@receiver(post_save, sender=Document)
+def index_document(sender, instance, **kwargs):
+    search.upsert(search.document_entry(instance))
+
+
+@receiver(post_save, sender=AttachmentText)
+def index_attachment_text(sender, instance, **kwargs):
+    search.upsert(search.attachment_entry(instance))
+
+
+@receiver(post_save, sender=Notification)
+def index_notification(sender, instance, **kwargs):
+    search.upsert(search.notification_entry(instance))
+
+
+@receiver(post_delete, sender=Application)
+def unindex_application(sender, instance, **kwargs):
+    search.remove("application", instance.pk)
+
+
+@receiver(post_delete, sender=Document)
+def unindex_document(sender, instance, **kwargs):
+    search.remove("document", instance.pk)
+
+
+@receiver(post_delete, sender=AttachmentText)
+def unindex_attachment_text(sender, instance, **kwargs):
+    search.remove("attachment", instance.attachment_id)
+
+
+@receiver(post_delete, sender=Notification)
+def unindex_notification(sender, instance, **kwargs):
+    search.remove("notification", instance.pk)
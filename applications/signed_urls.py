@@ -0,0 +1,102 @@
+# applications/signed_urls.py
+"""
+Cached presigned GET URLs for attachments.
+
+Time is cut into WINDOW-second buckets and a URL is cached under
+(object key, bucket). Every URL is signed for WINDOW + MARGIN seconds, so
+one handed out at any point of its bucket still has at least MARGIN
+seconds left; the next bucket gets a fresh signature. Within a bucket the
+same URL is reused, which also lets browsers cache the object.
+
+Attachment lists sign every URL up front with attach_urls(), so links go
+straight to S3. Each link also carries the time its URL stays valid until;
+clicked later than that (a page left open), it falls back to
+download_attachment, which redirects to a fresh URL. The cache is per
+process: signing is local HMAC work, so a shared cache would cost more
+than it saves.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from . import aws
+
+WINDOW = int(os.getenv("APPMGR_SIGNED_URL_WINDOW", "3000"))
+MARGIN = int(os.getenv("APPMGR_SIGNED_URL_MARGIN", "600"))
+EXPIRES = WINDOW + MARGIN
+MAX_ENTRIES = 4096
+
+_lock = threading.Lock()
+_cache: "OrderedDict[tuple, str]" = OrderedDict()
+
+
+def _reset() -> None:
+    global _lock
+    _lock = threading.Lock()
+    _cache.clear()
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+def _bucket_no() -> int:
+    return int(time.time() // WINDOW)
+
+
+def download_urls(keys: Iterable[str], now: Optional[int] = None) -> Dict[str, str]:
+    """Presigned GET URL for each key, signing only the ones not cached."""
+    bucket = os.getenv("AWS_STORAGE_BUCKET_NAME")
+    now = _bucket_no() if now is None else now
+    urls: Dict[str, str] = {}
+    missing = []
+    with _lock:
+        for key in keys:
+            if not key or key in urls:
+                continue
+            url = _cache.get((key, now))
+            if url is None:
+                missing.append(key)
+            else:
+                _cache.move_to_end((key, now))
+                urls[key] = url
+    if not missing:
+        return urls
+
+    s3 = aws.client("s3")
+    signed = {
+        key: s3.generate_presigned_url(
+            "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=EXPIRES
+        )
+        for key in dict.fromkeys(missing)
+    }
+    with _lock:
+        for key, url in signed.items():
+            _cache[(key, now)] = url
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    urls.update(signed)
+    return urls
+
+
+def download_url(key: str) -> str:
+    """Presigned GET URL for key; "" for an empty key."""
+    return download_urls([key]).get(key, "")
+
+
+def attach_urls(attachments) -> list:
+    """
+    Set .download_url and .download_expires (Unix time the URL is valid
+    until, at least) on each attachment, signing in one pass.
+    """
+    attachments = list(attachments)
+    now = _bucket_no()
+    urls = download_urls((a.file.name for a in attachments), now)
+    # Signed at some point in bucket `now`, so valid at least this long.
+    expires = now * WINDOW + EXPIRES
+    for a in attachments:
+        a.download_url = urls.get(a.file.name, "")
+        a.download_expires = expires
+    return attachments
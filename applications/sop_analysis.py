@@ -0,0 +1,280 @@
+# applications/sop_analysis.py
+"""
+Groq-backed SOP analysis, streamed as markdown.
+
+The SOP is sized in tokens. One that fits in CHUNK_TOKENS is analysed in a
+single streamed call. A longer one is split on paragraph boundaries, each
+chunk is critiqued concurrently (map), and the notes are merged into the
+usual section layout by one streamed call (reduce). Every prompt stays
+bounded, and time to first token tracks the slowest chunk rather than the
+whole document.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from typing import AsyncIterator, List, Optional
+
+from asgiref.sync import sync_to_async
+from groq import AsyncGroq
+
+CHUNK_TOKENS = int(os.getenv("APPMGR_SOP_CHUNK_TOKENS", "6000"))
+MAP_CONCURRENCY = int(os.getenv("APPMGR_SOP_MAP_CONCURRENCY", "4"))
+MAP_MAX_TOKENS = 1024
+# Used when the tiktoken encoding cannot be loaded (it is fetched on first use).
+CHARS_PER_TOKEN = 4
+# After a failed load, estimate from length for this long before retrying.
+ENCODING_RETRY_SECONDS = 300
+
+log = logging.getLogger(__name__)
+
+SECTIONS = (
+    "# Executive Summary\n"
+    "## Overall Score (0–10)\n"
+    "## Category Ratings\n"
+    "## Program Fit (College/Faculty/Research Alignment)\n"
+    "## Strengths\n"
+    "## Issues / Gaps\n"
+    "## High-Impact Edits (bullet list)\n"
+)
+
+TRUNCATED_NOTE = (
+    "\n(The document was cut at the length limit; the ending above is "
+    "not the author's.)"
+)
+
+
+class StreamResult:
+    """Set by stream_markdown: complete is False if any part went unreviewed."""
+
+    def __init__(self):
+        self.complete = True
+
+
+def stream_model() -> str:
+    return os.getenv("GROQ_STREAM_MODEL", "openai/gpt-oss-20b")
+
+
+_enc = None
+_enc_failed_at = None
+_enc_lock = threading.Lock()
+
+
+def _encoding():
+    """The tiktoken encoding, or None while it cannot be loaded."""
+    global _enc, _enc_failed_at
+    if _enc is not None:
+        return _enc
+    with _enc_lock:
+        now = time.monotonic()
+        if _enc is None and (
+            _enc_failed_at is None or now - _enc_failed_at > ENCODING_RETRY_SECONDS
+        ):
+            try:
+                import tiktoken
+
+                _enc = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                _enc_failed_at = now
+                log.warning(
+                    "tiktoken unavailable, estimating tokens from length: %s", e
+                )
+    return _enc
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    enc = _encoding()
+    if enc is None:
+        step = max_tokens * CHARS_PER_TOKEN
+        return [text[i : i + step] for i in range(0, len(text), step)]
+    ids = enc.encode(text, disallowed_special=())
+    return [enc.decode(ids[i : i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+
+
+def split_chunks(text: str, max_tokens: int = CHUNK_TOKENS) -> List[str]:
+    """
+    Pack paragraphs (blank-line separated) into chunks of at most max_tokens.
+    A single paragraph over the limit is cut on token boundaries.
+    """
+    chunks: List[str] = []
+    cur: List[str] = []
+    cur_tokens = 0
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        n = count_tokens(para)
+        if n > max_tokens:
+            pieces = _split_oversized(para, max_tokens)
+        else:
+            pieces = [para]
+        for piece in pieces:
+            n = count_tokens(piece) if len(pieces) > 1 else n
+            if cur and cur_tokens + n > max_tokens:
+                chunks.append("\n\n".join(cur))
+                cur, cur_tokens = [], 0
+            cur.append(piece)
+            cur_tokens += n
+    if cur:
+        chunks.append("\n\n".join(cur))
+    return chunks
+
+
+def _system_prompt(research: str) -> str:
+    if research:
+        guidance = (
+            "Use the provided web research on what this college/program expects "
+            "from a strong SOP. "
+        )
+    else:
+        guidance = (
+            "Use the browser_search tool if helpful to check expectations for a "
+            "strong SOP for the given college/program. "
+        )
+    return (
+        "You are an admissions editor. " + guidance + "Output MARKDOWN ONLY with "
+        "these sections:\n" + SECTIONS + "Keep it concise, concrete, skimmable. "
+        "No prose outside markdown."
+    )
+
+
+def _header(college: str, program: str, notes: str, research: str) -> str:
+    header = (
+        f"College: {college}\nProgram: {program}\n"
+        f"Evaluator notes: {notes or '(none)'}\n\n"
+    )
+    if research:
+        header += f"{research}\n\n"
+    return header
+
+
+async def _critique_chunk(
+    client, sem: asyncio.Semaphore, model: str, header: str, chunk: str, i: int, n: int
+) -> str:
+    system = (
+        "You are an admissions editor reviewing one part of a longer Statement "
+        "of Purpose. Write terse markdown bullet notes under three headings: "
+        "Strengths, Issues, Suggested edits. Quote short phrases where useful. "
+        "Do not score or summarise the whole SOP."
+    )
+    user = header + f"Part {i} of {n}:\n---BEGIN PART---\n{chunk}\n---END PART---"
+    async with sem:
+        resp = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            temperature=0.2,
+            top_p=1,
+            max_completion_tokens=MAP_MAX_TOKENS,
+            reasoning_effort="low",
+        )
+    return (resp.choices[0].message.content or "").strip()
+
+
+async def stream_markdown(
+    sop_text: str,
+    college: str,
+    program: str,
+    notes: str,
+    research: str = "",
+    truncated: bool = False,
+    result: Optional[StreamResult] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Stream **markdown** chunks from Groq. We instruct the model to output
+    only markdown with specific section headings. With a precomputed
+    research digest (see expectations.py) the model gets no browser_search
+    tool, so nothing is fetched before the first token. If some parts of a
+    long SOP could not be reviewed, result.complete is set to False.
+    """
+    model = stream_model()
+    header = _header(college, program, notes, research)
+    # Tokenizing (and a first tiktoken load) is CPU and network work; keep
+    # it off the event loop.
+    chunks = await sync_to_async(split_chunks, thread_sensitive=False)(
+        sop_text, CHUNK_TOKENS
+    )
+
+    extra = {} if research else {"tools": [{"type": "browser_search"}]}
+    async with AsyncGroq(api_key=os.getenv("GROQ_API_KEY")) as client:
+        if len(chunks) <= 1:
+            sop_block = f"---BEGIN SOP---\n{sop_text}\n---END SOP---"
+            if truncated:
+                sop_block += TRUNCATED_NOTE
+            if research:
+                ask = "Analyze this SOP:\n"
+            else:
+                ask = "Do a brief browser_search if needed, then analyze this SOP:\n"
+            user = header + ask + sop_block
+        else:
+            sem = asyncio.Semaphore(MAP_CONCURRENCY)
+            n = len(chunks)
+            results = await asyncio.gather(
+                *(
+                    _critique_chunk(client, sem, model, header, c, i, n)
+                    for i, c in enumerate(chunks, start=1)
+                ),
+                return_exceptions=True,
+            )
+            # One failed part should not sink the analysis; merge what came
+            # back and say which parts are missing.
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if len(errors) == n:
+                raise errors[0]
+            if errors and result is not None:
+                result.complete = False
+            critiques = []
+            for i, r in enumerate(results, start=1):
+                if isinstance(r, BaseException):
+                    log.warning("SOP part %d/%d critique failed: %s", i, n, r)
+                    r = "(No notes: this part could not be reviewed.)"
+                critiques.append(r)
+            parts = "\n\n".join(
+                f"### Part {i} of {n}\n{c}" for i, c in enumerate(critiques, start=1)
+            )
+            notes_block = f"---BEGIN NOTES---\n{parts}\n---END NOTES---"
+            if truncated:
+                notes_block += TRUNCATED_NOTE
+            if research:
+                ask = "Merge these notes into one analysis of the whole SOP."
+            else:
+                ask = (
+                    "Do a brief browser_search if needed, then merge these notes "
+                    "into one analysis of the whole SOP."
+                )
+            user = (
+                header
+                + f"The SOP was too long to review at once, so it was read in {n} "
+                "consecutive parts. Reviewer notes per part:\n"
+                + notes_block
+                + "\n\n"
+                + ask
+            )
+
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": _system_prompt(research)},
+                {"role": "user", "content": user},
+            ],
+            temperature=0.2,
+            top_p=1,
+            max_completion_tokens=4096,
+            reasoning_effort="medium",
+            stream=True,
+            **extra,
+        )
+        async for chunk in stream:
+            yield (chunk.choices[0].delta.content or "").encode("utf-8")
@@ -0,0 +1,279 @@
+# applications/state.py
+"""
+Application-state backends.
+
+Status/priority for each Application can live in DynamoDB (the original
+setup), directly in the Application table, or in process memory for tests and
+benchmarks. Pick one with settings.APPMGR_STATE_BACKEND (dotted path); views
+call the module-level functions below and never touch a backend directly.
+
+With settings.APPMGR_STATE_OUTBOX enabled, the write functions only record a
+StateOutbox row (call them inside the transaction that changes the
+Application) and drain_state_outbox relays them to the backend. Without it
+the backend is called once that transaction commits; a failure there is
+logged and never rolls back or fails the request.
+"""
+
+import abc
+import logging
+import threading
+from typing import Any, Dict, Mapping, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils.module_loading import import_string
+
+log = logging.getLogger(__name__)
+
+
+class StateBackend(abc.ABC):
+    """Interface every backend implements. Defaults are built on get_all_states."""
+
+    @abc.abstractmethod
+    def get_all_states(self, username: str) -> Dict[str, Dict[str, Any]]: ...
+
+    def get_state(self, username: str, app_id: int) -> Optional[Dict[str, Any]]:
+        return self.get_all_states(username).get(str(app_id))
+
+    @abc.abstractmethod
+    def put_state(
+        self, username: str, app_id: int, status: str, priority: int
+    ) -> None: ...
+
+    @abc.abstractmethod
+    def update_status(
+        self, username: str, app_id: int, status: str, *, priority: Optional[int] = None
+    ) -> None: ...
+
+    @abc.abstractmethod
+    def update_priorities(
+        self, username: str, priorities: Mapping[int, int]
+    ) -> None: ...
+
+    def update_priority(self, username: str, app_id: int, priority: int) -> None:
+        self.update_priorities(username, {app_id: priority})
+
+    @abc.abstractmethod
+    def delete_state(self, username: str, app_id: int) -> None: ...
+
+    def overlay_states(self, username: str, app_objs: list) -> None:
+        """
+        Overlay stored status onto Application objects in-place for rendering.
+        Priority is not overlaid: the dashboard orders by the Application
+        column, which stays authoritative.
+        """
+        states = self.get_all_states(username)
+        for a in app_objs:
+            st = states.get(str(a.id))
+            if st and "status" in st:
+                a.status = st["status"]
+
+
+class DynamoStateBackend(StateBackend):
+    """The per-user DynamoDB item managed by applications/ddb.py."""
+
+    def __init__(self):
+        from . import ddb
+
+        self._ddb = ddb
+
+    def get_all_states(self, username):
+        return self._ddb.get_all_states(username)
+
+    def get_state(self, username, app_id):
+        return self._ddb.get_state(username, app_id)
+
+    def put_state(self, username, app_id, status, priority):
+        self._ddb.put_state(username, app_id, status, priority)
+
+    def update_status(self, username, app_id, status, *, priority=None):
+        self._ddb.update_status(username, app_id, status, priority=priority)
+
+    def update_priorities(self, username, priorities):
+        self._ddb.update_priorities(username, priorities)
+
+    def delete_state(self, username, app_id):
+        self._ddb.delete_state(username, app_id)
+
+
+class PostgresStateBackend(StateBackend):
+    """
+    Reads and writes the status/priority columns of Application itself, so
+    the rows the dashboard already loaded are the state: no second service.
+    """
+
+    def _apps(self, username: str):
+        from .models import Application
+
+        return Application.objects.filter(user__username=username)
+
+    def get_all_states(self, username):
+        return {
+            str(pk): {"status": status, "priority": priority}
+            for pk, status, priority in self._apps(username).values_list(
+                "id", "status", "priority"
+            )
+        }
+
+    def put_state(self, username, app_id, status, priority):
+        self._apps(username).filter(id=app_id).update(
+            status=status, priority=int(priority)
+        )
+
+    def update_status(self, username, app_id, status, *, priority=None):
+        fields = {"status": status}
+        if priority is not None:
+            fields["priority"] = int(priority)
+        self._apps(username).filter(id=app_id).update(**fields)
+
+    def update_priorities(self, username, priorities):
+        if not priorities:
+            return
+        whens = [When(id=int(aid), then=Value(int(p))) for aid, p in priorities.items()]
+        self._apps(username).filter(id__in=[int(a) for a in priorities]).update(
+            priority=Case(*whens, output_field=IntegerField())
+        )
+
+    def delete_state(self, username, app_id):
+        # State is the row itself; deleting the Application removes it.
+        pass
+
+    def overlay_states(self, username, app_objs):
+        # Objects loaded from the Application table already carry the state.
+        pass
+
+
+class InMemoryStateBackend(StateBackend):
+    """Process-local dict store for tests and benchmarks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def get_all_states(self, username):
+        with self._lock:
+            return {k: dict(v) for k, v in self._data.get(username, {}).items()}
+
+    def put_state(self, username, app_id, status, priority):
+        with self._lock:
+            self._data.setdefault(username, {})[str(app_id)] = {
+                "status": status,
+                "priority": int(priority),
+            }
+
+    def update_status(self, username, app_id, status, *, priority=None):
+        with self._lock:
+            cur = self._data.setdefault(username, {}).setdefault(
+                str(app_id), {"priority": 999}
+            )
+            cur["status"] = status
+            if priority is not None:
+                cur["priority"] = int(priority)
+
+    def update_priorities(self, username, priorities):
+        with self._lock:
+            apps = self._data.setdefault(username, {})
+            for aid, p in priorities.items():
+                apps.setdefault(str(aid), {"status": "SUBMITTED"})["priority"] = int(p)
+
+    def delete_state(self, username, app_id):
+        with self._lock:
+            self._data.get(username, {}).pop(str(app_id), None)
+
+
+_backend: Optional[StateBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> StateBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(
+                    settings,
+                    "APPMGR_STATE_BACKEND",
+                    "applications.state.DynamoStateBackend",
+                )
+                _backend = import_string(path)()
+    return _backend
+
+
+def get_all_states(username: str) -> Dict[str, Dict[str, Any]]:
+    return get_backend().get_all_states(username)
+
+
+def get_state(username: str, app_id: int) -> Optional[Dict[str, Any]]:
+    return get_backend().get_state(username, app_id)
+
+
+def _use_outbox() -> bool:
+    return bool(getattr(settings, "APPMGR_STATE_OUTBOX", False))
+
+
+def _after_commit(func, *args, **kwargs) -> None:
+    # Best-effort, like the delete path always was: no transaction is held
+    # open across the round trip, and a failure only costs a stale backend.
+    def write():
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            log.exception("state backend write failed")
+
+    transaction.on_commit(write)
+
+
+def put_state(username: str, app_id: int, status: str, priority: int) -> None:
+    if _use_outbox():
+        from . import outbox
+
+        outbox.enqueue_upsert(username, app_id, status=status, priority=priority)
+        return
+    _after_commit(get_backend().put_state, username, app_id, status, priority)
+
+
+def update_status(
+    username: str, app_id: int, status: str, *, priority: Optional[int] = None
+) -> None:
+    if _use_outbox():
+        from . import outbox
+
+        outbox.enqueue_upsert(username, app_id, status=status, priority=priority)
+        return
+    _after_commit(
+        get_backend().update_status, username, app_id, status, priority=priority
+    )
+
+
+def update_priority(username: str, app_id: int, priority: int) -> None:
+    update_priorities(username, {app_id: priority})
+
+
+def update_priorities(username: str, priorities: Mapping[int, int]) -> None:
+    if _use_outbox():
+        from . import outbox
+
+        outbox.enqueue_priorities(username, priorities)
+        return
+    _after_commit(get_backend().update_priorities, username, dict(priorities))
+
+
+def delete_state(username: str, app_id: int) -> None:
+    if _use_outbox():
+        from . import outbox
+
+        outbox.enqueue_delete(username, app_id)
+        return
+    _after_commit(get_backend().delete_state, username, app_id)
+
+
+def overlay_states(username: str, app_objs: list) -> None:
+    if _use_outbox():
+        # Until the outbox is drained the Application row is newer than the
+        # backend; overlaying would show the previous status.
+        from . import outbox
+
+        pending = outbox.pending_app_ids(username)
+        app_objs = [a for a in app_objs if a.id not in pending]
+    get_backend().overlay_states(username, app_objs)
@@ -0,0 +1,351 @@
+import datetime
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from applications import mail_sync
+from applications.models import MailboxCheckpoint, Notification
+
+ACCOUNT = "me@imap.example.com"
+HEADER_KEY = f"BODY[HEADER.FIELDS ({mail_sync.HEADER_FIELDS})]".encode()
+
+
+def raw_message(uid, subject=None, message_id=None, body=None, date=None):
+    headers = [
+        f"Subject: {subject or f'Message {uid}'}",
+        f"Date: {date or 'Mon, 1 Sep 2025 10:00:00 +0000'}",
+    ]
+    if message_id is not False:
+        headers.append(f"Message-ID: {message_id or f'<m{uid}@example.com>'}")
+    return ("\r\n".join(headers) + "\r\n\r\n" + (body or f"Body {uid}")).encode()
+
+
+def fetch_data(raw):
+    header, _, body = raw.partition(b"\r\n\r\n")
+    return {
+        HEADER_KEY: header + b"\r\n\r\n",
+        b"BODY[TEXT]<0>": body[: mail_sync.SNIPPET_BYTES],
+    }
+
+
+class FakeError(Exception):
+    pass
+
+
+class FakeIMAP:
+    """
+    Just enough of IMAPClient for sync_mailbox: one folder, UIDs in
+    ascending order, and the "N:*" quirk of real servers.
+    """
+
+    Error = FakeError
+
+    def __init__(self, uidvalidity=1):
+        self.uidvalidity = uidvalidity
+        self.messages = {}
+        self.unseen = set()
+        self.dropped = set()
+        self.fetches = []
+
+    def add(self, uid, seen=False, **kw):
+        self.messages[uid] = raw_message(uid, **kw)
+        if not seen:
+            self.unseen.add(uid)
+
+    def select_folder(self, name, readonly=False):
+        return {
+            b"UIDVALIDITY": self.uidvalidity,
+            b"UIDNEXT": max(self.messages, default=0) + 1,
+        }
+
+    def search(self, criteria):
+        if criteria == "UNSEEN":
+            return sorted(self.unseen)
+        low = int(criteria[1].split(":")[0])
+        uids = [u for u in self.messages if u >= low]
+        return uids or [max(self.messages)]
+
+    def fetch(self, uids, items):
+        self.fetches.append(list(uids))
+        return {
+            u: fetch_data(self.messages[u])
+            for u in uids
+            if u in self.messages and u not in self.dropped
+        }
+
+
+def sync(client):
+    return mail_sync.sync_mailbox(client, ACCOUNT, "INBOX")
+
+
+def checkpoint():
+    return MailboxCheckpoint.objects.get(account=ACCOUNT, mailbox="INBOX")
+
+
+class ParseTests(TestCase):
+    def test_headers_and_snippet(self):
+        raw = raw_message(
+            7,
+            subject="=?utf-8?q?Admission_d=C3=A9cision?=",
+            date="Tue, 2 Sep 2025 08:30:00 +0200",
+        )
+        n = mail_sync.parse(fetch_data(raw), "Junk")
+        self.assertEqual(n.source, "Junk")
+        self.assertEqual(n.subject, "Admission décision")
+        self.assertEqual(n.message_id, "<m7@example.com>")
+        self.assertEqual(n.snippet, "Body 7")
+        self.assertEqual(
+            n.received_at,
+            datetime.datetime(2025, 9, 2, 6, 30, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_missing_fields(self):
+        raw = b"Date: not a date\r\n\r\n"
+        n = mail_sync.parse(fetch_data(raw), "INBOX")
+        self.assertEqual(n.subject, "(no subject)")
+        self.assertEqual(n.message_id, "")
+        self.assertEqual(n.snippet, "")
+        self.assertIsNotNone(n.received_at)
+
+    def test_snippet_from_truncated_multipart(self):
+        body = "Congratulations! " * 300
+        raw = (
+            "Subject: Offer\r\n"
+            "Content-Type: multipart/mixed; boundary=BB\r\n\r\n"
+            "--BB\r\nContent-Type: text/plain; charset=utf-8\r\n\r\n"
+            f"{body}\r\n--BB\r\nContent-Type: application/pdf\r\n\r\n"
+            "JVBERi0xLjQK\r\n--BB--\r\n"
+        ).encode()
+        n = mail_sync.parse(fetch_data(raw), "INBOX")
+        self.assertTrue(n.snippet.startswith("Congratulations!"))
+        self.assertLessEqual(len(n.snippet), mail_sync.SNIPPET_CHARS)
+
+
+class NewRowsTests(TestCase):
+    def row(self, message_id):
+        return mail_sync.parse(
+            fetch_data(raw_message(1, message_id=message_id)), "INBOX"
+        )
+
+    def test_drops_stored_and_repeated_message_ids(self):
+        stored = self.row("<old@example.com>")
+        stored.save()
+        rows = [
+            self.row("<old@example.com>"),
+            self.row("<new@example.com>"),
+            self.row("<new@example.com>"),
+        ]
+        fresh = mail_sync._new_rows(rows)
+        self.assertEqual([r.message_id for r in fresh], ["<new@example.com>"])
+
+    def test_keeps_rows_without_message_id(self):
+        rows = [self.row(False), self.row(False)]
+        self.assertEqual(len(mail_sync._new_rows(rows)), 2)
+
+
+class SyncMailboxTests(TestCase):
+    def test_first_sync_takes_unseen_only(self):
+        client = FakeIMAP()
+        client.add(1, seen=True)
+        client.add(2)
+        client.add(3, seen=True)
+        self.assertEqual(sync(client), 1)
+        self.assertEqual(
+            list(Notification.objects.values_list("subject", flat=True)),
+            ["Message 2"],
+        )
+        self.assertEqual(checkpoint().last_uid, 3)
+
+    def test_checkpoint_advances(self):
+        client = FakeIMAP()
+        client.add(1)
+        sync(client)
+        client.add(2, seen=True)
+        client.add(3)
+        self.assertEqual(sync(client), 2)
+        self.assertEqual(checkpoint().last_uid, 3)
+        self.assertEqual(client.fetches[-1], [2, 3])
+
+    def test_nothing_new_skips_fetch(self):
+        client = FakeIMAP()
+        client.add(1)
+        sync(client)
+        fetches = len(client.fetches)
+        self.assertEqual(sync(client), 0)
+        self.assertEqual(len(client.fetches), fetches)
+
+    def test_fetches_in_batches(self):
+        client = FakeIMAP()
+        client.add(1)
+        sync(client)
+        for uid in range(2, 7):
+            client.add(uid)
+        with mock.patch.object(mail_sync, "FETCH_BATCH", 2):
+            self.assertEqual(sync(client), 5)
+        self.assertEqual(client.fetches[1:], [[2, 3], [4, 5], [6]])
+        self.assertEqual(checkpoint().last_uid, 6)
+
+    def test_uidvalidity_change_restarts(self):
+        client = FakeIMAP(uidvalidity=1)
+        for uid in (1, 2, 3):
+            client.add(uid)
+        sync(client)
+        # The server renumbered the folder: same mail, new UIDs.
+        renumbered = FakeIMAP(uidvalidity=2)
+        renumbered.add(1, message_id="<m1@example.com>")
+        renumbered.add(2, message_id="<m2@example.com>")
+        self.assertEqual(sync(renumbered), 0)
+        cp = checkpoint()
+        self.assertEqual((cp.uidvalidity, cp.last_uid), (2, 2))
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_duplicate_message_id_stored_once(self):
+        client = FakeIMAP()
+        client.add(1)
+        sync(client)
+        client.add(2, message_id="<m1@example.com>")
+        client.add(3)
+        self.assertEqual(sync(client), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(checkpoint().last_uid, 3)
+
+    def test_missing_uids_are_logged(self):
+        client = FakeIMAP()
+        client.add(1)
+        sync(client)
+        for uid in (2, 3, 4):
+            client.add(uid)
+        client.dropped = {3}
+        with self.assertLogs(mail_sync.log, "WARNING") as logs:
+            self.assertEqual(sync(client), 2)
+        self.assertIn("UIDs 3", logs.output[0])
+        self.assertEqual(checkpoint().last_uid, 4)
+
+
+class IdleIMAP(FakeIMAP):
+    """FakeIMAP plus IDLE. Each idle_check() returns the next queued reply;
+    an exception in the queue is raised, an empty queue waits out the timeout."""
+
+    def __init__(self, replies=(), exists=True):
+        super().__init__()
+        self.replies = list(replies)
+        self.exists = exists
+        self.idling = False
+        self.idle_timeouts = []
+        self.logged_out = False
+
+    def folder_exists(self, name):
+        return self.exists
+
+    def idle(self):
+        self.idling = True
+
+    def idle_check(self, timeout):
+        self.idle_timeouts.append(timeout)
+        if self.replies:
+            reply = self.replies.pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+        time.sleep(timeout)
+        return []
+
+    def idle_done(self):
+        self.idling = False
+
+    def logout(self):
+        self.logged_out = True
+
+
+class RecordingEvent(threading.Event):
+    """Records wait() calls instead of sleeping; sets itself after `limit`."""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.waits = []
+
+    def wait(self, timeout=None):
+        self.waits.append(timeout)
+        if len(self.waits) >= self.limit:
+            self.set()
+        return self.is_set()
+
+
+@mock.patch.object(mail_sync, "sync_mailbox", return_value=0)
+class WatchTests(SimpleTestCase):
+    conf = {"host": "imap.example.com", "user": "me", "password": "x"}
+
+    def test_idle_returns_on_new_mail(self, sync_mailbox):
+        client = IdleIMAP(replies=[[(1, b"FETCH")], [(4, b"EXISTS")]])
+        mail_sync._idle_once(client, threading.Event())
+        self.assertEqual(client.idle_timeouts, [mail_sync.IDLE_CHECK] * 2)
+        self.assertFalse(client.idling)
+
+    def test_idle_returns_on_stop(self, sync_mailbox):
+        stop = threading.Event()
+        stop.set()
+        client = IdleIMAP()
+        mail_sync._idle_once(client, stop)
+        self.assertEqual(client.idle_timeouts, [])
+        self.assertFalse(client.idling)
+
+    def test_idle_ends_after_error(self, sync_mailbox):
+        client = IdleIMAP(replies=[ConnectionResetError("gone")])
+        with self.assertRaises(ConnectionResetError):
+            mail_sync._idle_once(client, threading.Event())
+        self.assertFalse(client.idling)
+
+    def test_reconnect_backoff(self, sync_mailbox):
+        stop = RecordingEvent(limit=5)
+        with mock.patch.object(
+            mail_sync, "connect", side_effect=ConnectionRefusedError("down")
+        ), mock.patch.object(mail_sync, "MAX_BACKOFF", 5):
+            with self.assertLogs(mail_sync.log, "WARNING"):
+                mail_sync.watch_mailbox(self.conf, "INBOX", stop)
+        self.assertEqual(stop.waits, [1, 2, 4, 5, 5])
+
+    def test_backoff_resets_after_sync(self, sync_mailbox):
+        client = IdleIMAP(replies=[ConnectionResetError("gone")])
+        stop = RecordingEvent(limit=3)
+        connects = [ConnectionRefusedError("down")] * 2 + [client]
+        with mock.patch.object(mail_sync, "connect", side_effect=connects):
+            with self.assertLogs(mail_sync.log, "WARNING"):
+                mail_sync.watch_mailbox(self.conf, "INBOX", stop)
+        self.assertEqual(stop.waits, [1, 2, 1])
+        sync_mailbox.assert_called_once_with(client, "me@imap.example.com", "INBOX")
+        self.assertTrue(client.logged_out)
+
+    def test_missing_mailbox_ends_watch(self, sync_mailbox):
+        client = IdleIMAP(exists=False)
+        with mock.patch.object(mail_sync, "connect", return_value=client):
+            mail_sync.watch_mailbox(self.conf, "Spam", threading.Event())
+        sync_mailbox.assert_not_called()
+        self.assertTrue(client.logged_out)
+
+    def test_watch_stops_promptly(self, sync_mailbox):
+        clients = []
+
+        def connect(conf):
+            clients.append(IdleIMAP())
+            return clients[-1]
+
+        stop = threading.Event()
+        with mock.patch.object(mail_sync, "connect", side_effect=connect):
+            with mock.patch.object(mail_sync, "IDLE_CHECK", 0.05):
+                watcher = threading.Thread(
+                    target=mail_sync.watch, args=(self.conf, ["INBOX", "Junk"], stop)
+                )
+                watcher.start()
+                while len(clients) < 2 or not all(c.idling for c in clients):
+                    time.sleep(0.01)
+                stop.set()
+                watcher.join(timeout=1)
+        self.assertFalse(watcher.is_alive())
+        self.assertTrue(all(c.logged_out and not c.idling for c in clients))
+
+    def test_stop_is_checked_within_kill_timeout(self, sync_mailbox):
+        # Fly sends SIGKILL 5 s after SIGTERM by default.
+        self.assertLess(mail_sync.IDLE_CHECK, 5)
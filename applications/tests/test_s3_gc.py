@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from applications import s3_gc
+from applications.models import S3Tombstone
+
+
+class FakeS3:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.deleted = []
+        self.available_during_call = None
+
+    def delete_objects(self, Bucket, Delete):
+        # What another purger would see while this call is in flight.
+        self.available_during_call = S3Tombstone.objects.filter(
+            available_at__lte=timezone.now()
+        ).count()
+        keys = [o["Key"] for o in Delete["Objects"]]
+        self.deleted += [k for k in keys if k not in self.failing]
+        return {
+            "Errors": [
+                {"Key": k, "Message": "AccessDenied"} for k in keys if k in self.failing
+            ]
+        }
+
+
+class PurgeTests(TestCase):
+    def setUp(self):
+        for key in ("alice/a.pdf", "alice/b.pdf", "alice/c.pdf"):
+            S3Tombstone.objects.create(bucket="bucket", key=key)
+
+    def purge(self, s3):
+        with mock.patch.object(s3_gc.aws, "client", return_value=s3):
+            return s3_gc.purge()
+
+    def test_deletes_and_backs_off_failures(self):
+        s3 = FakeS3(failing={"alice/b.pdf"})
+        self.assertEqual(self.purge(s3), 2)
+        self.assertEqual(s3.deleted, ["alice/a.pdf", "alice/c.pdf"])
+        row = S3Tombstone.objects.get()
+        self.assertEqual((row.key, row.attempts), ("alice/b.pdf", 1))
+        self.assertEqual(row.last_error, "AccessDenied")
+        self.assertGreater(row.available_at, timezone.now())
+
+    def test_rows_are_leased_during_the_s3_call(self):
+        s3 = FakeS3()
+        self.purge(s3)
+        self.assertEqual(s3.available_during_call, 0)
+        self.assertFalse(S3Tombstone.objects.exists())
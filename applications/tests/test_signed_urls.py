@@ -0,0 +1,46 @@
+import os
+import time
+import urllib.parse
+from types import SimpleNamespace
+from unittest import mock
+
+import boto3
+from django.test import SimpleTestCase
+
+from applications import signed_urls
+
+
+def attachment(key):
+    return SimpleNamespace(file=SimpleNamespace(name=key))
+
+
+@mock.patch.dict(os.environ, {"AWS_STORAGE_BUCKET_NAME": "bucket"})
+class SignedUrlTests(SimpleTestCase):
+    def setUp(self):
+        s3 = boto3.client(
+            "s3",
+            region_name="ap-southeast-1",
+            aws_access_key_id="key",
+            aws_secret_access_key="secret",
+        )
+        patcher = mock.patch.object(signed_urls.aws, "client", return_value=s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        signed_urls._cache.clear()
+
+    def test_attach_urls_expiry_is_conservative(self):
+        atts = signed_urls.attach_urls([attachment("alice/a.pdf"), attachment("")])
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(atts[0].download_url).query)
+        expires = int(query.get("Expires", query.get("X-Amz-Expires", ["0"]))[0])
+        self.assertLessEqual(atts[0].download_expires, expires)
+        self.assertGreaterEqual(
+            atts[0].download_expires, time.time() + signed_urls.MARGIN - 1
+        )
+        self.assertEqual(atts[1].download_url, "")
+
+    def test_urls_are_reused_within_a_window(self):
+        first = signed_urls.download_url("alice/a.pdf")
+        self.assertEqual(signed_urls.download_url("alice/a.pdf"), first)
+
+    def test_empty_key(self):
+        self.assertEqual(signed_urls.download_url(""), "")
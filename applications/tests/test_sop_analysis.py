@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from applications import analysis_cache, sop_analysis
+from applications.models import SopAnalysis
+
+
+def message(content):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+    )
+
+
+class FakeGroq:
+    """AsyncGroq stand-in: part critiques fail when failing says so, and
+    the final streamed call yields a single chunk."""
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __call__(self, **kwargs):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def create(self, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            return self.stream()
+        if self.calls in self.failing:
+            raise RuntimeError("429 Too Many Requests")
+        return message(f"notes {self.calls}")
+
+    async def stream(self):
+        yield SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content="# Analysis"))]
+        )
+
+
+@async_to_sync
+async def run(groq, key):
+    result = sop_analysis.StreamResult()
+    text = "\n\n".join(f"Paragraph {i} " + "word " * 50 for i in range(4))
+    # No tiktoken download: tokens are estimated from length.
+    with mock.patch.object(
+        sop_analysis, "_encoding", return_value=None
+    ), mock.patch.object(sop_analysis, "AsyncGroq", groq), mock.patch.object(
+        sop_analysis, "CHUNK_TOKENS", 80
+    ):
+        body = analysis_cache.record(
+            key,
+            "model",
+            sop_analysis.stream_markdown(
+                text, "NUS", "MComp", "", "digest", False, result
+            ),
+            complete=lambda: result.complete,
+        )
+        out = b"".join([chunk async for chunk in body])
+    return out, result
+
+
+class PartialAnalysisTests(TestCase):
+    def test_complete_analysis_is_stored(self):
+        out, result = run(FakeGroq(), "k1")
+        self.assertEqual(out, b"# Analysis")
+        self.assertTrue(result.complete)
+        self.assertTrue(SopAnalysis.objects.filter(cache_key="k1").exists())
+
+    def test_partial_analysis_is_not_stored(self):
+        out, result = run(FakeGroq(failing={2}), "k2")
+        self.assertEqual(out, b"# Analysis")
+        self.assertFalse(result.complete)
+        self.assertFalse(SopAnalysis.objects.filter(cache_key="k2").exists())
@@ -0,0 +1,43 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from applications import state
+
+
+@override_settings(APPMGR_STATE_OUTBOX=False)
+class InlineWriteTests(TestCase):
+    def setUp(self):
+        self.backend = state.InMemoryStateBackend()
+        patcher = mock.patch.object(state, "_backend", self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_written_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                state.put_state("alice", 1, "SUBMITTED", 1)
+                self.assertEqual(self.backend.get_all_states("alice"), {})
+        self.assertEqual(
+            self.backend.get_all_states("alice"),
+            {"1": {"status": "SUBMITTED", "priority": 1}},
+        )
+
+    def test_not_written_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    state.update_status("alice", 1, "ACCEPTED")
+                    raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.backend.get_all_states("alice"), {})
+
+    def test_backend_failure_is_logged(self):
+        with mock.patch.object(
+            self.backend, "update_priorities", side_effect=ConnectionError("down")
+        ):
+            with self.assertLogs(state.log, "ERROR"):
+                with self.captureOnCommitCallbacks(execute=True):
+                    with transaction.atomic():
+                        state.update_priorities("alice", {1: 2})
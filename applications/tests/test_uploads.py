@@ -0,0 +1,63 @@
+import json
+import os
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from applications.models import Application, Attachment, S3Tombstone
+
+
+@mock.patch.dict(os.environ, {"AWS_STORAGE_BUCKET_NAME": "bucket"})
+class ForeignKeyTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice")
+        self.app = Application.objects.create(
+            user=self.alice, college_name="NUS", program_name="MComp"
+        )
+        self.client.force_login(self.alice)
+
+    def finalize(self, key):
+        return self.client.post(
+            "/api/finalize/",
+            json.dumps({"application_id": self.app.id, "doc_type": "SOP", "key": key}),
+            content_type="application/json",
+        )
+
+    def test_finalize_rejects_other_users_key(self):
+        resp = self.finalize("bob/NUS/MComp/SOP/1700000000_sop.pdf")
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Attachment.objects.exists())
+
+    @mock.patch("applications.indexing.schedule")
+    def test_finalize_accepts_own_key(self, schedule):
+        resp = self.finalize("alice/NUS/MComp/SOP/1700000000_sop.pdf")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(Attachment.objects.filter(application=self.app).exists())
+
+    def test_finalize_batch_rejects_whole_batch(self):
+        files = [
+            {"key": "alice/NUS/MComp/SOP/1700000000_a.pdf", "title": "a"},
+            {"key": "bob/NUS/MComp/SOP/1700000000_b.pdf", "title": "b"},
+        ]
+        resp = self.client.post(
+            "/api/finalize/batch/",
+            json.dumps(
+                {"application_id": self.app.id, "doc_type": "SOP", "files": files}
+            ),
+            content_type="application/json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Attachment.objects.exists())
+
+    def test_delete_tombstones_own_key_only(self):
+        for key in ("alice/NUS/MComp/SOP/1_a.pdf", "bob/NUS/MComp/SOP/1_b.pdf"):
+            Attachment.objects.create(
+                application=self.app, doc_type="SOP", title=key, file=key
+            )
+        with self.assertLogs("applications.signals", "WARNING"):
+            self.app.delete()
+        self.assertEqual(
+            list(S3Tombstone.objects.values_list("key", flat=True)),
+            ["alice/NUS/MComp/SOP/1_a.pdf"],
+        )
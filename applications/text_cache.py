@@ -0,0 +1,115 @@
+# applications/text_cache.py
+"""
+Cache of text extracted from attachments.
+
+Entries are keyed by the S3 key, the object's ETag and the extraction
+budget (extract.MAX_CHARS), so a repeat analysis of the same SOP costs one
+HEAD request instead of a download and a pdfminer/python-docx parse. The
+parser is chosen from the key's file name, not the user-editable title, so
+everything in the key is fixed for a given object: attachments that share
+one (see dedup.py) share its entry whatever their titles.
+
+The table is capped at MAX_BYTES of text and evicts least-recently-used
+entries beyond that. Each process keeps a running estimate of the total and
+only recounts it every RECOUNT_INTERVAL seconds.
+"""
+
+import datetime
+import hashlib
+import os
+import threading
+import time
+
+from botocore.exceptions import ClientError, NoCredentialsError
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import aws
+from .extract import MAX_CHARS, Extracted
+from .extract_pool import extract_text
+from .models import ExtractedText
+from .utils_s3 import read_attachment_bytes
+
+MAX_BYTES = int(os.getenv("APPMGR_TEXT_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Avoid a write per hit; recency only needs to be roughly right for eviction.
+TOUCH_INTERVAL = datetime.timedelta(minutes=10)
+RECOUNT_INTERVAL = 300
+
+_total_lock = threading.Lock()
+_total = None  # bytes cached, as last counted plus this process's inserts
+_counted_at = 0.0
+
+
+def _object_etag(key: str) -> str:
+    bucket = os.getenv("AWS_STORAGE_BUCKET_NAME")
+    if not bucket:
+        raise RuntimeError("AWS_STORAGE_BUCKET_NAME not set")
+    try:
+        head = aws.client("s3").head_object(Bucket=bucket, Key=key)
+    except NoCredentialsError as e:
+        raise RuntimeError("AWS credentials not configured") from e
+    except ClientError as e:
+        msg = e.response.get("Error", {}).get("Message", "unknown S3 error")
+        raise RuntimeError(f"S3 head_object failed: {msg}") from e
+    return (head.get("ETag") or "").strip('"')
+
+
+def _evict(added: int) -> None:
+    global _total, _counted_at
+    with _total_lock:
+        now = time.monotonic()
+        if _total is None or now - _counted_at > RECOUNT_INTERVAL:
+            _total = ExtractedText.objects.aggregate(total=Sum("size"))["total"] or 0
+            _counted_at = now
+        else:
+            _total += added
+        if _total <= MAX_BYTES:
+            return
+        doomed = []
+        for pk, size in ExtractedText.objects.order_by("last_used_at").values_list(
+            "pk", "size"
+        ):
+            doomed.append(pk)
+            _total -= size
+            if _total <= MAX_BYTES:
+                break
+        ExtractedText.objects.filter(pk__in=doomed).delete()
+
+
+def get_attachment_text(att, wait: float = 0) -> Extracted:
+    """
+    Budgeted text of att's S3 object (see extract.extract_text), from the
+    cache when possible. Parsing happens in extract_pool, so this can raise
+    ExtractorBusy (after waiting up to wait seconds for a slot) or
+    ExtractionFailed.
+    """
+    key = att.file.name
+    etag = _object_etag(key)
+    cache_key = hashlib.sha256(f"{key}\0{etag}\0{MAX_CHARS}".encode()).hexdigest()
+
+    hit = ExtractedText.objects.filter(cache_key=cache_key).first()
+    if hit is not None:
+        now = timezone.now()
+        if now - hit.last_used_at > TOUCH_INTERVAL:
+            ExtractedText.objects.filter(pk=hit.pk).update(last_used_at=now)
+        return Extracted(hit.text, hit.truncated, hit.page_count)
+
+    data = read_attachment_bytes(att)
+    result = extract_text(key, data, max_chars=MAX_CHARS, wait=wait)
+    size = len(result.text.encode("utf-8"))
+    try:
+        ExtractedText.objects.create(
+            cache_key=cache_key,
+            s3_key=key,
+            etag=etag,
+            text=result.text,
+            truncated=result.truncated,
+            page_count=result.pages,
+            size=size,
+        )
+    except IntegrityError:
+        pass  # a concurrent request stored it first
+    else:
+        _evict(size)
+    return result
@@ -5,6 +5,7 @@ app_name = "applications"
 
 urlpatterns = [
     path("", views.dashboard, name="dashboard"),
+    path("rows/", views.dashboard_rows, name="dashboard_rows"),
     path("reorder/", views.applications_reorder, name="applications_reorder"),
     path("new/", views.application_create, name="application_create"),
     path(
@@ -12,6 +13,11 @@ urlpatterns = [
         views.application_attachments,
         name="application_attachments",
     ),
+    path(
+        "<int:pk>/attachments/zip/",
+        views.download_attachments_zip,
+        name="application_attachments_zip",
+    ),
     path(
         "<int:pk>/status/",
         views.application_update_status,
@@ -28,5 +34,6 @@ urlpatterns = [
         views.download_attachment,
         name="attachment_download",
     ),
+    path("search/", views.search_view, name="search"),
     path("signup/", views.signup, name="signup"),
 ]
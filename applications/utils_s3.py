@@ -1,6 +1,8 @@
-import os, boto3
+import os
 from botocore.exceptions import NoCredentialsError, ClientError
 
+from . import aws
+
 
 def read_attachment_bytes(att):
     """
@@ -8,17 +10,10 @@ def read_attachment_bytes(att):
     Works even if DEFAULT_FILE_STORAGE is FileSystemStorage.
     """
     bucket = os.getenv("AWS_STORAGE_BUCKET_NAME")
-    region = os.getenv("AWS_S3_REGION_NAME", "ap-southeast-1")
     if not bucket:
         raise RuntimeError("AWS_STORAGE_BUCKET_NAME not set")
 
-    s3 = boto3.client(
-        "s3",
-        region_name=region,
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        aws_session_token=os.getenv("AWS_SESSION_TOKEN") or None,
-    )
+    s3 = aws.client("s3")
     try:
         obj = s3.get_object(Bucket=bucket, Key=att.file.name)
         return obj["Body"].read()
@@ -2,7 +2,7 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from django.contrib import messages
-import os, boto3, io
+import os
 from django.http import (
     HttpResponseForbidden,
     StreamingHttpResponse,
@@ -10,12 +10,34 @@ from django.http import (
     JsonResponse,
     HttpResponse,
     HttpResponseBadRequest,
+    Http404,
+)
+from django.db import close_old_connections, transaction
+import json, hashlib, base64, datetime
+from django.db.models import Q
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+    quote_etag,
+)
+from django.utils.safestring import mark_safe
+from django.utils.http import content_disposition_header
+from . import (
+    analysis_cache,
+    expectations,
+    fragments,
+    indexing,
+    ranking,
+    search,
+    signed_urls,
+    sop_analysis,
+    state,
+    zipstream,
 )
-from django.db import transaction
-import json
-from . import ddb
 from django.views.decorators.csrf import ensure_csrf_cookie
-from .ddb import put_state, get_all_states, update_status, delete_state, put_state
 
 from django.views.decorators.http import require_POST
 from .models import Application, Program, College, Document, Notification
@@ -23,12 +45,14 @@ from .forms import DocumentForm, ApplicationCreateForm
 from .models import Application, Document, Notification, Attachment
 from django.template.loader import render_to_string
 from django.views.decorators.http import require_GET
-from groq import Groq
-from .utils_s3 import read_attachment_bytes
-from pdfminer.high_level import extract_text as pdf_extract
+from asgiref.sync import sync_to_async
+from .extract_pool import ExtractionFailed, ExtractorBusy
 from django.contrib.auth import login as auth_login
 from .forms import DocumentForm, ApplicationCreateForm, SignupForm
 
+DASHBOARD_CACHE_TTL = int(os.getenv("APPMGR_DASHBOARD_CACHE_TTL", "3600"))
+DASHBOARD_PAGE_SIZE = int(os.getenv("APPMGR_DASHBOARD_PAGE_SIZE", "50"))
+
 
 def home(request):
     return redirect("applications:dashboard")
@@ -37,7 +61,12 @@ def home(request):
 @login_required
 def application_attachments(request, pk: int):
     app = get_object_or_404(Application, pk=pk, user=request.user)
-    return render(request, "applications/application_attachments.html", {"app": app})
+    attachments = signed_urls.attach_urls(app.attachments.all())
+    return render(
+        request,
+        "applications/application_attachments.html",
+        {"app": app, "attachments": attachments},
+    )
 
 
 @login_required
@@ -63,40 +92,17 @@ def delete_application(request, pk):
         messages.error(request, "You are not allowed to delete that application.")
         return redirect("applications:dashboard")
 
-    # Delete any S3 files for attachments
-    aws_region = os.getenv("AWS_S3_REGION_NAME", "ap-southeast-1")
-    bucket = os.getenv("AWS_STORAGE_BUCKET_NAME")
-    if bucket:
-        s3 = boto3.client(
-            "s3",
-            region_name=aws_region,
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        )
-        keys = [
-            {"Key": att.file.name}
-            for att in app.attachments.all()
-            if att.file and att.file.name
-        ]
-        if keys:
-            for i in range(0, len(keys), 1000):
-                s3.delete_objects(Bucket=bucket, Delete={"Objects": keys[i : i + 1000]})
-
     username = request.user.username
-    app.delete()
-
-    remaining = list(
-        Application.objects.filter(user=request.user)
-        .order_by("priority", "-last_updated", "id")
-        .only("id", "priority")
-    )
-    for idx, a in enumerate(remaining, start=1):
-        if a.priority != idx:
-            Application.objects.filter(id=a.id, user=request.user).update(priority=idx)
+    app_id = app.id
+    with transaction.atomic():
+        # Remaining rows keep their rank keys; positions are renumbered on render.
+        # Attachment S3 objects are tombstoned by the cascade and purged later.
+        app.delete()
+        # State sync is best-effort; the savepoint keeps a failure from
+        # rolling back the delete itself.
         try:
-            from . import ddb as _ddb
-
-            _ddb.update_priority(username, a.id, idx)
+            with transaction.atomic():
+                state.delete_state(username, app_id)
         except Exception:
             pass
 
@@ -113,73 +119,208 @@ def download_attachment(request, pk):
     att = get_object_or_404(Attachment, pk=pk)
     if att.application.user_id != request.user.id:
         return HttpResponseForbidden("Not allowed")
+    if not att.file.name:
+        raise Http404("No file")
 
-    s3 = boto3.client(
-        "s3",
-        region_name=os.getenv("AWS_S3_REGION_NAME", "ap-southeast-1"),
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+    return HttpResponseRedirect(signed_urls.download_url(att.file.name))
+
+
+def _zip_entries(user, app_id, doc_type):
+    try:
+        app = get_object_or_404(Application, pk=app_id, user=user)
+        atts = app.attachments.order_by("doc_type", "created_at")
+        if doc_type:
+            atts = atts.filter(doc_type=doc_type)
+        used = set()
+        entries = [
+            zipstream.Entry(
+                f"{a.doc_type}/"
+                + zipstream.unique_name(a.title or os.path.basename(a.file.name), used),
+                a.file.name,
+                timezone.localtime(a.created_at).timetuple()[:6],
+            )
+            for a in atts
+        ]
+        parts = [app.college_name, app.program_name, doc_type]
+        name = "-".join(p for p in parts if p) or f"application-{app.pk}"
+        return f"{name}.zip", entries
+    finally:
+        close_old_connections()
+
+
+@login_required
+async def download_attachments_zip(request, pk):
+    """
+    Streams a ZIP of every attachment on the application, optionally only
+    ?doc_type=SOP|LOR|.... Objects are read from S3 in chunks and the
+    archive is written as it goes (see zipstream.py), so memory stays flat
+    and the first bytes go out straight away.
+    """
+    doc_type = (request.GET.get("doc_type") or "").strip().upper()
+    user = await request.auser()
+    filename, entries = await sync_to_async(_zip_entries, thread_sensitive=False)(
+        user, pk, doc_type
     )
-    bucket = os.getenv("AWS_STORAGE_BUCKET_NAME")
-    presigned = s3.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": bucket, "Key": att.file.name},
-        ExpiresIn=300,
+    resp = StreamingHttpResponse(
+        zipstream.aiter_zip(entries, os.getenv("AWS_STORAGE_BUCKET_NAME")),
+        content_type="application/zip",
     )
-    return HttpResponseRedirect(presigned)
+    resp["Content-Disposition"] = content_disposition_header(True, filename)
+    resp["Cache-Control"] = "no-store"
+    return resp
 
 
 @require_POST
 @login_required
 def applications_reorder(request):
+    """
+    Move one row. Body: {"id": <moved id>, "after": <id now above it, or null
+    for the top>}. Only the moved application is written.
+    """
     try:
         payload = json.loads(request.body or "{}")
-        order = [int(x) for x in payload.get("order", [])]
+        app_id = int(payload["id"])
+        after = payload.get("after")
+        after_id = None if after in (None, "") else int(after)
     except Exception:
         return HttpResponseBadRequest("Bad JSON")
 
-    apps = Application.objects.filter(user=request.user, id__in=order).only(
-        "id", "status"
+    try:
+        pos = ranking.move_after(request.user, app_id, after_id)
+    except Application.DoesNotExist:
+        return HttpResponseBadRequest("Unknown application")
+
+    return JsonResponse({"ok": True, "id": app_id, "priority": pos})
+
+
+def _csrf_part(request) -> str:
+    # Rendered rows embed a CSRF token, so fragment keys also cover the CSRF secret.
+    get_token(request)
+    return hashlib.sha1((request.META.get("CSRF_COOKIE") or "").encode()).hexdigest()[
+        :12
+    ]
+
+
+def _encode_cursor(app, offset: int) -> str:
+    raw = json.dumps([app.rank, app.last_updated.isoformat(), app.id, offset])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    rank, last_updated, app_id, offset = json.loads(raw)
+    return (
+        str(rank),
+        datetime.datetime.fromisoformat(last_updated),
+        int(app_id),
+        int(offset),
     )
-    allowed = {a.id: a for a in apps}
-    sequence = [aid for aid in order if aid in allowed]
 
-    with transaction.atomic():
-        for idx, app_id in enumerate(sequence, start=1):
-            Application.objects.filter(id=app_id, user=request.user).update(
-                priority=idx, last_updated=timezone.now()
-            )
-            ddb.update_priority(request.user.username, app_id, priority=idx)
 
-    return JsonResponse({"ok": True, "order": sequence})
+def _rows_page(request, user_stamp: str, csrf_part: str, cursor: str = "") -> str:
+    """
+    One keyset page of dashboard rows on (rank, -last_updated, id), plus a
+    sentinel row that loads the next page when scrolled into view.
+    """
+    key = f"dash:rows:{request.user.id}:{user_stamp}:{csrf_part}:{cursor}"
+    html = cache.get(key)
+    if html is not None:
+        return html
+
+    qs = Application.objects.filter(user=request.user)
+    offset = 0
+    if cursor:
+        rank, last_updated, app_id, offset = _decode_cursor(cursor)
+        qs = qs.filter(
+            Q(rank__gt=rank)
+            | Q(rank=rank, last_updated__lt=last_updated)
+            | Q(rank=rank, last_updated=last_updated, id__gt=app_id)
+        )
+    apps = list(qs.order_by("rank", "-last_updated", "id")[: DASHBOARD_PAGE_SIZE + 1])
+    next_cursor = ""
+    if len(apps) > DASHBOARD_PAGE_SIZE:
+        apps = apps[:DASHBOARD_PAGE_SIZE]
+        next_cursor = _encode_cursor(apps[-1], offset + len(apps))
+
+    state.overlay_states(request.user.username, apps)
+    for idx, a in enumerate(apps, start=offset + 1):
+        a.priority = idx
+    html = render_to_string(
+        "applications/partials/_app_rows.html",
+        {
+            "apps": apps,
+            "first_page": not cursor,
+            "next_cursor": next_cursor,
+            "status_choices": Application._meta.get_field("status").choices,
+        },
+        request=request,
+    )
+    cache.set(key, html, DASHBOARD_CACHE_TTL)
+    return html
+
+
+@login_required
+@require_GET
+def dashboard_rows(request):
+    """HTMX endpoint: the page of rows after ?cursor=."""
+    try:
+        html = _rows_page(
+            request,
+            fragments.user_stamp(request.user.id),
+            _csrf_part(request),
+            request.GET.get("cursor", ""),
+        )
+    except (ValueError, TypeError):
+        return HttpResponseBadRequest("bad cursor")
+    return HttpResponse(html)
 
 
 @login_required
 @ensure_csrf_cookie
 def dashboard(request):
-    apps = list(
-        Application.objects.filter(user=request.user).order_by(
-            "priority", "-last_updated", "id"
+    csrf_part = _csrf_part(request)
+    user_stamp = fragments.user_stamp(request.user.id)
+    notifs_stamp = fragments.notifications_stamp()
+    etag = quote_etag(f"{request.user.id}-{user_stamp}-{notifs_stamp}-{csrf_part}")
+
+    # Pending flash messages are part of the page and get consumed on render.
+    has_messages = len(messages.get_messages(request)) > 0
+    if not has_messages:
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+    rows_html = _rows_page(request, user_stamp, csrf_part)
+
+    # Notifications come from the ops mailbox: staff see all of them, other
+    # users only the ones linked to their own applications.
+    notifs = Notification.objects.order_by("-received_at")
+    if request.user.is_staff:
+        notifs_key = f"dash:notifs:{notifs_stamp}:staff"
+    else:
+        notifs = notifs.filter(related_application__user=request.user)
+        notifs_key = f"dash:notifs:{notifs_stamp}:{request.user.id}"
+    notifs_html = cache.get(notifs_key)
+    if notifs_html is None:
+        notifs = notifs[:10]
+        notifs_html = render_to_string(
+            "applications/partials/_notifications.html", {"notifs": notifs}
         )
-    )
+        cache.set(notifs_key, notifs_html, DASHBOARD_CACHE_TTL)
 
-    states = get_all_states(request.user.username)
-    for a in apps:
-        st = states.get(str(a.id))
-        if st and "status" in st:
-            a.status = st["status"]
-
-    status_choices = Application._meta.get_field("status").choices
-    notifs = Notification.objects.order_by("-received_at")[:10]
-    return render(
+    resp = render(
         request,
         "applications/dashboard.html",
         {
-            "apps": apps,
-            "notifs": notifs,
-            "status_choices": status_choices,
+            "rows_html": mark_safe(rows_html),
+            "notifs_html": mark_safe(notifs_html),
         },
     )
+    if not has_messages:
+        resp["ETag"] = etag
+    patch_cache_control(resp, private=True, no_cache=True)
+    patch_vary_headers(resp, ["Cookie"])
+    return resp
 
 
 @login_required
@@ -193,16 +334,18 @@ def application_create(request):
             app.status = "draft"
             next_priority = Application.objects.filter(user=request.user).count() + 1
             app.priority = next_priority
-            app.save()
-            app.status = "submitted"
-            app.save(update_fields=["status"])
-
-            put_state(
-                request.user.username,
-                app.id,
-                app.status,
-                getattr(app, "priority", next_priority),
-            )
+            with transaction.atomic():
+                app.rank = ranking.next_rank(request.user)
+                app.save()
+                app.status = "submitted"
+                app.save(update_fields=["status"])
+
+                state.put_state(
+                    request.user.username,
+                    app.id,
+                    app.status,
+                    getattr(app, "priority", next_priority),
+                )
 
             messages.success(
                 request,
@@ -213,25 +356,31 @@ def application_create(request):
     else:
         form = ApplicationCreateForm()
 
+    attachments = signed_urls.attach_urls(app.attachments.all()) if app else []
     return render(
-        request, "applications/application_form.html", {"form": form, "app": app}
+        request,
+        "applications/application_form.html",
+        {"form": form, "app": app, "attachments": attachments},
     )
 
 
 @login_required
 def application_update_status(request, pk):
     app = get_object_or_404(Application, pk=pk, user=request.user)
+    app.priority = ranking.position(app)
     if request.method == "POST":
         new_status = request.POST.get("status")
         valid = dict(Application._meta.get_field("status").choices)
         if new_status in valid:
             app.status = new_status
-            update_status(
-                request.user.username,
-                app.id,
-                new_status,
-                priority=getattr(app, "priority", 999),
-            )
+            with transaction.atomic():
+                app.save(update_fields=["status", "last_updated"])
+                state.update_status(
+                    request.user.username,
+                    app.id,
+                    new_status,
+                    priority=getattr(app, "priority", 999),
+                )
     status_choices = Application._meta.get_field("status").choices
     return render(
         request,
@@ -268,85 +417,6 @@ def sop_assistant(request):
     return render(request, "applications/sop_assistant.html", {"outline": outline})
 
 
-def extract_text_from_bytes(filename, data: bytes) -> str:
-    name = (filename or "").lower()
-    if name.endswith(".txt"):
-        return data.decode("utf-8", errors="ignore")
-    if name.endswith(".docx"):
-        from docx import Document as Docx
-
-        d = Docx(io.BytesIO(data))
-        return "\n".join(p.text for p in d.paragraphs)
-    if name.endswith(".pdf"):
-        return pdf_extract(io.BytesIO(data))
-    return data.decode("utf-8", errors="ignore")
-
-
-def fetch_sop_expectations(college: str, program: str) -> str:
-    api_key = os.getenv("TAVILY_API_KEY")
-    if not api_key:
-        return ""
-    try:
-        from tavily import TavilyClient
-
-        tv = TavilyClient(api_key=api_key)
-        q = f"what do admissions committees at {college} look for in a Statement of Purpose for {program}? key components, common pitfalls, recommended structure"
-        res = tv.search(q, max_results=5)
-        bullets = []
-        for item in res.get("results", [])[:5]:
-            title = item.get("title", "")
-            content = item.get("content", "")
-            bullets.append(f"- {title}: {content[:300]}...")
-        return "Web research highlights:\n" + "\n".join(bullets)
-    except Exception:
-        return ""
-
-
-def groq_stream_markdown(sop_text: str, college: str, program: str, notes: str):
-    """
-    Stream **markdown** chunks from Groq. We instruct the model to output
-    only markdown with specific section headings.
-    """
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    model = os.getenv("GROQ_STREAM_MODEL", "openai/gpt-oss-20b")
-
-    system = (
-        "You are an admissions editor. Use the browser_search tool if helpful to check "
-        "expectations for a strong SOP for the given college/program. "
-        "Output MARKDOWN ONLY with these sections:\n"
-        "# Executive Summary\n"
-        "## Overall Score (0–10)\n"
-        "## Category Ratings\n"
-        "## Program Fit (College/Faculty/Research Alignment)\n"
-        "## Strengths\n"
-        "## Issues / Gaps\n"
-        "## High-Impact Edits (bullet list)\n"
-        "Keep it concise, concrete, skimmable. No prose outside markdown."
-    )
-    user = (
-        f"College: {college}\nProgram: {program}\nEvaluator notes: {notes or '(none)'}\n\n"
-        "Do a brief browser_search if needed, then analyze this SOP:\n"
-        f"---BEGIN SOP---\n{sop_text[:70000]}\n---END SOP---"
-    )
-
-    stream = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-        temperature=0.2,
-        top_p=1,
-        max_completion_tokens=4096,
-        reasoning_effort="medium",
-        tools=[{"type": "browser_search"}],
-        stream=True,
-    )
-
-    for chunk in stream:
-        yield (chunk.choices[0].delta.content or "").encode("utf-8")
-
-
 @login_required
 def sop_assistant(request):
     """
@@ -354,42 +424,105 @@ def sop_assistant(request):
     No POST handler: analysis is done via GET /stream/.
     """
     apps = Application.objects.filter(user=request.user).order_by(
-        "priority", "-last_updated"
+        "rank", "-last_updated"
     )
     return render(request, "applications/sop_assistant.html", {"apps": apps})
 
 
+def _prepare_sop_stream(user, app_id: int, att_id: int, notes: str, fresh: bool):
+    """
+    Blocking half of sop_assistant_stream: ownership check, S3 read / text
+    extraction, research digest and analysis-cache lookup, in one thread hop.
+    """
+    close_old_connections()
+    try:
+        att = get_object_or_404(
+            Attachment.objects.select_related("application"),
+            pk=att_id,
+            application__user=user,
+            application_id=app_id,
+            doc_type="SOP",
+        )
+        app = att.application
+        # Normally indexed at upload time; parsed inline only if not yet done.
+        extracted = indexing.attachment_text(att)
+        text = extracted.text.strip()
+        if not text:
+            return None
+        research = expectations.get_digest(app.college_name, app.program_name) or ""
+        model = sop_analysis.stream_model()
+        key = analysis_cache.analysis_key(
+            text, app.college_name, app.program_name, notes, model, research
+        )
+        return {
+            "text": text,
+            "truncated": extracted.truncated,
+            "college": app.college_name,
+            "program": app.program_name,
+            "research": research,
+            "model": model,
+            "key": key,
+            "cached": None if fresh else analysis_cache.lookup(key),
+        }
+    finally:
+        close_old_connections()
+
+
 @login_required
-def sop_assistant_stream(request):
+async def sop_assistant_stream(request):
     """
     Streams markdown. Query params:
-      ?application_id=<id>&attachment_id=<id>&notes=<text>
+      ?application_id=<id>&attachment_id=<id>&notes=<text>[&fresh=1]
+    Finished analyses are replayed from analysis_cache unless fresh=1.
+    Async so that, under the ASGI worker, a long generation does not tie up
+    a thread; the blocking S3/DB work runs in the thread pool.
     """
     app_id = (request.GET.get("application_id") or "").strip()
     att_id = (request.GET.get("attachment_id") or "").strip()
     notes = (request.GET.get("notes") or "").strip()
+    fresh = request.GET.get("fresh") == "1"
     if not (app_id.isdigit() and att_id.isdigit()):
         return HttpResponseBadRequest("Pick an application and an SOP.")
 
-    att = get_object_or_404(
-        Attachment,
-        pk=int(att_id),
-        application__user=request.user,
-        application_id=int(app_id),
-        doc_type="SOP",
-    )
-    app = att.application
-
-    data = read_attachment_bytes(att)  # S3-safe
-    text = extract_text_from_bytes(att.title or att.file.name, data).strip()
-    if not text:
+    user = await request.auser()
+    try:
+        job = await sync_to_async(_prepare_sop_stream, thread_sensitive=False)(
+            user, int(app_id), int(att_id), notes, fresh
+        )
+    except ExtractorBusy:
+        resp = HttpResponse(
+            "Busy reading other documents, try again shortly.", status=503
+        )
+        resp["Retry-After"] = "5"
+        return resp
+    except ExtractionFailed:
+        job = None
+    if job is None:
         return HttpResponseBadRequest("Could not extract text from that file.")
 
-    resp = StreamingHttpResponse(
-        groq_stream_markdown(text, app.college_name, app.program_name, notes),
-        content_type="text/plain; charset=utf-8",
-    )
+    cached = job["cached"]
+    if cached is not None:
+        body = analysis_cache.replay(cached)
+    else:
+        result = sop_analysis.StreamResult()
+        body = analysis_cache.record(
+            job["key"],
+            job["model"],
+            sop_analysis.stream_markdown(
+                job["text"],
+                job["college"],
+                job["program"],
+                notes,
+                job["research"],
+                job["truncated"],
+                result,
+            ),
+            complete=lambda: result.complete,
+        )
+
+    resp = StreamingHttpResponse(body, content_type="text/plain; charset=utf-8")
     resp["Cache-Control"] = "no-cache"
+    resp["X-Analysis-Cache"] = "miss" if cached is None else "hit"
     return resp
 
 
@@ -409,6 +542,19 @@ def sop_sops_for_app(request):
     return HttpResponse(html)
 
 
+@login_required
+@require_GET
+def search_view(request):
+    """HTMX search-as-you-type: ?q=<text> -> ranked hits with snippets."""
+    q = (request.GET.get("q") or "").strip()
+    hits = search.search(request.user, q) if len(q) >= 2 else []
+    return render(
+        request,
+        "applications/partials/_search_results.html",
+        {"q": q, "hits": hits},
+    )
+
+
 def signup(request):
     if request.method == "POST":
         form = SignupForm(request.POST)
@@ -98,6 +98,22 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 LOGIN_REDIRECT_URL = "applications:dashboard"
 LOGOUT_REDIRECT_URL = "applications:dashboard"
 
+# --- Cache ---
+# File-based by default so every gunicorn worker on the VM shares one cache.
+# Version stamps (fragments.py, ddb.py) are bumped by other processes too, so
+# a deploy spread over several machines needs a shared backend: fly.toml uses
+# the database cache (createcachetable); Redis or memcached also work.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "APPMGR_CACHE_BACKEND",
+            "django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": os.getenv("APPMGR_CACHE_LOCATION", "/tmp/appmgr-cache"),
+        "TIMEOUT": 300,
+    }
+}
+
 # --- Static files (served by WhiteNoise) ---
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
@@ -106,6 +122,19 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 # --- OpenAI (optional) ---
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
+# --- Application state (status/priority) ---
+# applications.state.DynamoStateBackend | PostgresStateBackend | InMemoryStateBackend
+APPMGR_STATE_BACKEND = os.getenv(
+    "APPMGR_STATE_BACKEND", "applications.state.DynamoStateBackend"
+)
+# Record state writes in the StateOutbox table and relay them with
+# `manage.py drain_state_outbox --loop` instead of calling the backend inline.
+APPMGR_STATE_OUTBOX = os.getenv("APPMGR_STATE_OUTBOX", "0").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
 # --- AWS S3 for media (attachments) ---
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
@@ -126,10 +155,14 @@ MEDIA_URL = (
 )
 
 # --- Database (Supabase / Postgres via DATABASE_URL) ---
+# No persistent connections: under ASGI, sync views and sync_to_async calls
+# run on threads that come and go, so a connection kept per thread would
+# never be reused or closed and would pile up on the Supabase pooler. The
+# pooler already keeps the server-side connections warm.
 DATABASES = {
     "default": dj_database_url.config(
         env="DATABASE_URL",
-        conn_max_age=int(os.getenv("DB_CONN_MAX_AGE", "600")),
+        conn_max_age=0,
         ssl_require=True,
     )
 }
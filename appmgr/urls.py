@@ -12,5 +12,6 @@ urlpatterns = [
     path("healthz", healthz, name="healthz"),  # no trailing slash
     path("healthz/", healthz),  # support trailing slash too
     path("admin/", admin.site.urls),
+    path("api/", include("applications.api_urls")),
     path("", include("applications.urls")),
 ]